@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -35,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'rest_framework.authtoken',
@@ -90,6 +92,55 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# по умолчанию кэш в памяти процесса, в продакштене общий Redis: CACHE_REDIS_URL=redis://127.0.0.1:6379/3
+
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        },
+        # вытеснение по LRU задается в Redis: maxmemory-policy allkeys-lru
+        'catalog': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'catalog',
+            'TIMEOUT': 60 * 60,
+        },
+        # снимки токенов для inetshop.authentication, общие для всех процессов
+        'auth': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'auth',
+            'TIMEOUT': 15 * 60,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'default',
+        },
+        'catalog': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'catalog',
+            'TIMEOUT': 60 * 60,
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        # кэш в памяти сбрасывается только в своем процессе, поэтому короткое время жизни
+        # ограничивает, сколько другие процессы видят старый пароль или активность
+        'auth': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'auth',
+            'TIMEOUT': 60,
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -142,7 +193,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'inetshop.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': {'drf_spectacular.openapi.AutoSchema',
                              },
@@ -153,5 +204,62 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.TemplateHTMLRenderer'
     ]
 }
+
+# прайс-лист поставщика и размер пачки при импорте
+PARTNER_PRICE_LIST = BASE_DIR / 'file.yaml'
+PARTNER_IMPORT_BATCH_SIZE = 1000
+# таймаут скачивания прайса по ссылке, секунд
+PARTNER_FEED_TIMEOUT = 60
+
+# исходящие уведомления, см. inetshop.outbox
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 8
+# пауза перед повторной отправкой, секунд, удваивается с каждой попыткой
+OUTBOX_RETRY_DELAY = 30
+OUTBOX_MAX_RETRY_DELAY = 6 * 60 * 60
+# окно сводки о статусах заказов, секунд; 0 - письмо на каждую смену статуса
+OUTBOX_DIGEST_WINDOW = 0
+
+# брокер и хранилище результатов Celery. CELERY_PROFILE=memory - брокер в памяти процесса,
+# чтобы проверять маршрутизацию и воркеры без Redis
+CELERY_PROFILE = os.environ.get('CELERY_PROFILE', 'redis')
+if CELERY_PROFILE == 'memory':
+    CELERY_BROKER_URL = 'memory://'
+    CELERY_RESULT_BACKEND = 'cache+memory://'
+else:
+    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://127.0.0.1:6379/1')
+    CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://127.0.0.1:6379/2')
+
+# очереди: письма о регистрации и сбросе пароля не ждут за рассылками и загрузкой прайсов
+CELERY_TASK_DEFAULT_QUEUE = 'mail_bulk'
+CELERY_TASK_ROUTES = {
+    'inetshop.tasks.password_reset_token_created': {'queue': 'mail_critical'},
+    'inetshop.tasks.relay_outbox': {'queue': 'mail_critical'},
+    'inetshop.tasks.send_notifications': {'queue': 'mail_bulk'},
+    'inetshop.tasks.import_price_list': {'queue': 'imports'},
+}
+# на каждую очередь свой воркер со своими лимитами: python manage.py celery_worker imports
+CELERY_QUEUE_LIMITS = {
+    'mail_critical': {'concurrency': 4, 'prefetch_multiplier': 1},
+    'mail_bulk': {'concurrency': 2, 'prefetch_multiplier': 4},
+    'imports': {'concurrency': 1, 'prefetch_multiplier': 1},
+}
+
+CELERY_BEAT_SCHEDULE = {
+    # подтверждение почты не ждет в общей очереди за сменами статусов заказов
+    'relay-outbox-critical': {
+        'task': 'inetshop.tasks.relay_outbox',
+        'schedule': 10.0,
+        'kwargs': {'kinds': ['confirm_email']},
+        'options': {'queue': 'mail_critical'},
+    },
+    'relay-outbox-bulk': {
+        'task': 'inetshop.tasks.relay_outbox',
+        'schedule': 10.0,
+        'kwargs': {'kinds': ['order_status']},
+        'options': {'queue': 'mail_bulk'},
+    },
+}
+
 # SPECTACULAR_SETTINGS = {'TITLE': 'Django DRF Inetshop',
 #                         }
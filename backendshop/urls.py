@@ -21,7 +21,8 @@ from django.urls import path
 
 
 from inetshop.views import ProductInfoView, CategoryView, ShopView, PartnerUpdate, RegisterAccount, AccountDetails, \
-    LoginAccount, ProductsView, BasketView, OrderView
+    LoginAccount, ProductsView, BasketView, OrderView, OrderDetailView, PartnerUpdateStatus, \
+    PartnerOrders, OutboxMetricsView
 
 app_name = 'inetshop'
 
@@ -30,13 +31,18 @@ urlpatterns = [
     path('categories', CategoryView.as_view(), name='categories'),
     path('shops', ShopView.as_view(), name='shops'),
     path('products', ProductsView.as_view(), name='products'),
-    path('product/<product_id>', ProductInfoView.as_view(), name='product'),
+    path('product', ProductInfoView.as_view(), name='product-info'),
+    path('product/<int:product_id>', ProductInfoView.as_view(), name='product'),
     path('partner/update', PartnerUpdate.as_view(), name='partner-update'),
+    path('partner/update/<int:job_id>', PartnerUpdateStatus.as_view(), name='partner-update-status'),
+    path('partner/orders', PartnerOrders.as_view(), name='partner-orders'),
     path('user/register', RegisterAccount.as_view(), name='register-account'),
     path('user/login', LoginAccount.as_view(), name='user-login'),
     path('user/details', AccountDetails.as_view(), name='user-details'),
     path('basket', BasketView.as_view(), name='basket'),
     path('order', OrderView.as_view(), name='order'),
+    path('order/<int:order_id>', OrderDetailView.as_view(), name='order-detail'),
+    path('outbox/metrics', OutboxMetricsView.as_view(), name='outbox-metrics'),
     # path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     # path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
 ]
@@ -0,0 +1,88 @@
+"""
+Сравнение потокового чтения прайс-листа с загрузкой через yaml.FullLoader.
+
+Каждый способ запускается в отдельном процессе, чтобы пиковая память (ru_maxrss)
+не смешивалась между замерами:
+
+    python benchmarks/bench_feed_parser.py --goods 20000 50000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inetshop.feeds import FeedLoader, read_price_list  # noqa: E402
+
+MODES = ('full_loader', 'stream')
+
+
+def write_feed(path, goods):
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write('shop: Маркет\ncategories:\n  - id: 224\n    name: Смартфоны\ngoods:\n')
+        for number in range(goods):
+            fh.write(f'  - id: {number}\n'
+                     f'    category: 224\n'
+                     f'    model: apple/iphone/xr\n'
+                     f'    name: Смартфон Apple iPhone XR {number}GB (красный)\n'
+                     f'    price: {60000 + number % 1000}\n'
+                     f'    price_rrc: 69990\n'
+                     f'    quantity: {number % 10}\n'
+                     f'    parameters:\n'
+                     f'      "Диагональ (дюйм)": 6.1\n'
+                     f'      "Разрешение (пикс)": 1792x828\n'
+                     f'      "Встроенная память (Гб)": 256\n'
+                     f'      "Цвет": красный\n')
+
+
+def parse(mode, path):
+    """
+    Читает прайс и возвращает число товаров
+    """
+    if mode == 'full_loader':
+        with open(path) as fh:
+            return len(yaml.load(fh, Loader=yaml.FullLoader)['goods'])
+    with open(path, 'rb') as fh:
+        return sum(1 for key, _ in read_price_list(fh) if key == 'goods')
+
+
+def measure(mode, path):
+    output = subprocess.run([sys.executable, __file__, '--child', mode, path],
+                            check=True, capture_output=True, text=True).stdout
+    goods, seconds, max_rss = output.split()
+    return int(goods), float(seconds), int(max_rss)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--goods', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        started = time.perf_counter()
+        goods = parse(*args.child)
+        seconds = time.perf_counter() - started
+        # ru_maxrss в Linux указан в килобайтах
+        print(goods, seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        return
+
+    print(f'stream loader: {FeedLoader.__name__}')
+    print(f'{"goods":>8} {"mode":>12} {"seconds":>9} {"goods/s":>9} {"peak RSS, MB":>13}')
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.goods:
+            path = os.path.join(directory, f'feed_{size}.yaml')
+            write_feed(path, size)
+            for mode in MODES:
+                goods, seconds, max_rss = measure(mode, path)
+                print(f'{goods:>8} {mode:>12} {seconds:>9.2f} {goods / seconds:>9.0f} {max_rss / 1024:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Сравнение сериализаторов DRF + JSONRenderer с быстрым путем values() + UJSONRenderer.
+
+Схема создается в SQLite в памяти, поэтому PostgreSQL для замера не нужен:
+
+    python benchmarks/bench_serialization.py --rows 1000 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backendshop.settings')
+
+from django.conf import settings  # noqa: E402
+
+settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+django.setup()
+
+from django.apps import apps  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from inetshop.basket import refresh_order_totals  # noqa: E402
+from inetshop.documents import build_offer_documents, build_order_documents  # noqa: E402
+from inetshop.importer import PriceListImporter  # noqa: E402
+from inetshop.models import Order, OrderItem, Product, ProductInfo, User  # noqa: E402
+from inetshop.renderers import UJSONRenderer  # noqa: E402
+from inetshop.serializers import OrderSerializer, ProductInfoSerializer, ProductSerializer  # noqa: E402
+
+
+def create_schema():
+    with connection.schema_editor() as editor:
+        for model in apps.get_models():
+            if model._meta.managed and not model._meta.proxy:
+                editor.create_model(model)
+
+
+def load_catalog(rows):
+    PriceListImporter().run({
+        'shop': 'Маркет',
+        'categories': [{'id': 1, 'name': 'Смартфоны'}],
+        'goods': [{'id': number, 'category': 1, 'model': f'model/{number % 7}', 'name': f'Товар {number}',
+                   'price': 100 + number, 'price_rrc': 200 + number, 'quantity': number % 5,
+                   'parameters': {'Цвет': 'черный', 'Вес (г)': number % 3, 'Память (Гб)': 256}}
+                  for number in range(rows)],
+    })
+    user = User.objects.create(email='buyer@example.com', username='buyer')
+    info_ids = list(ProductInfo.objects.values_list('id', flat=True))
+    for start in range(0, len(info_ids), 10):
+        order = Order.objects.create(user=user, state='new')
+        OrderItem.objects.bulk_create([OrderItem(order=order, product_info_id=info_id, quantity=2)
+                                       for info_id in info_ids[start:start + 10]])
+        refresh_order_totals(order.id)
+
+
+def product_info_serializer():
+    queryset = ProductInfo.objects.select_related('shop', 'product__category').prefetch_related(
+        'product_parameters__parameter')
+    return JSONRenderer().render(ProductInfoSerializer(queryset, many=True).data)
+
+
+def product_info_values():
+    documents = build_offer_documents(ProductInfo.objects.values_list('id', flat=True))
+    return UJSONRenderer().render([document for _, document in documents.values()])
+
+
+def products_serializer():
+    return JSONRenderer().render(ProductSerializer(Product.objects.select_related('category'), many=True).data)
+
+
+def products_values():
+    return UJSONRenderer().render([{'name': row['name'], 'category': row['category__name']}
+                                   for row in Product.objects.values('name', 'category__name')])
+
+
+def orders_serializer():
+    queryset = Order.objects.prefetch_related(
+        'ordered_items__product_info__product__category',
+        'ordered_items__product_info__product_parameters__parameter').select_related('contact')
+    return JSONRenderer().render(OrderSerializer(queryset, many=True).data)
+
+
+def orders_values():
+    return UJSONRenderer().render(build_order_documents(Order.objects.all()))
+
+
+CASES = (
+    ('ProductInfoView', product_info_serializer, product_info_values),
+    ('ProductsView', products_serializer, products_values),
+    ('OrderView.get', orders_serializer, orders_values),
+)
+
+
+def measure(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    create_schema()
+    print(f'{"rows":>7} {"endpoint":<16} {"serializer rows/s":>18} {"values rows/s":>14} {"speedup":>8}')
+    for rows in args.rows:
+        ProductInfo.objects.all().delete()
+        Order.objects.all().delete()
+        Product.objects.all().delete()
+        User.objects.all().delete()
+        load_catalog(rows)
+        for name, slow, fast in CASES:
+            slow_seconds = measure(slow, args.repeat)
+            fast_seconds = measure(fast, args.repeat)
+            print(f'{rows:>7} {name:<16} {rows / slow_seconds:>18.0f} {rows / fast_seconds:>14.0f} '
+                  f'{slow_seconds / fast_seconds:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,18 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from inetshop.models import User
+from inetshop.models import OutboxMessage, User
+from inetshop.outbox import requeue_dead
 
 admin.site.register(User, UserAdmin)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'dedupe_key', 'state', 'attempts', 'available_at', 'leased_until', 'last_error')
+    list_filter = ('state', 'kind')
+    actions = ['requeue']
+
+    @admin.action(description='Отправить повторно недоставленные')
+    def requeue(self, request, queryset):
+        requeue_dead(queryset)
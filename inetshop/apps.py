@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class InetshopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inetshop'
+
+    def ready(self):
+        from rest_framework.authtoken.models import Token
+
+        from inetshop.authentication import invalidate_token, invalidate_user_tokens
+        from inetshop.models import User
+        from inetshop.search import install_search_index
+
+        # поисковый индекс зависит от базы, поэтому создается вне моделей
+        post_migrate.connect(install_search_index, sender=self)
+        # смена пароля, деактивация и удаление токена сбрасывают закэшированный вход
+        post_save.connect(invalidate_user_tokens, sender=User)
+        post_delete.connect(invalidate_token, sender=Token)
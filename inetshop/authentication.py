@@ -0,0 +1,63 @@
+"""
+Аутентификация по токену без запросов к базе: токен и данные пользователя берутся из кэша
+"""
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from inetshop.models import User
+
+# время жизни и вытеснение по LRU задаются настройками кэша
+AUTH_CACHE = caches['auth']
+
+# хэш пароля в кэш не кладем: поле остается отложенным и при необходимости читается из базы
+SNAPSHOT_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+
+
+def token_cache_key(key):
+    return f'token:{key}'
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который хранит снимок токена и пользователя в кэше auth.
+    При попадании в кэш запрос к базе не выполняется. Снимок сбрасывается при сохранении
+    пользователя (смена пароля, деактивация) и при удалении токена, см. invalidate_*
+    """
+
+    def authenticate_credentials(self, key):
+        snapshot = AUTH_CACHE.get(token_cache_key(key))
+        if snapshot is None:
+            try:
+                token = Token.objects.select_related('user').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            snapshot = {
+                'token': (token.key, token.user_id, token.created),
+                'user': [getattr(token.user, name) for name in SNAPSHOT_FIELDS],
+            }
+            AUTH_CACHE.set(token_cache_key(key), snapshot)
+
+        user = User.from_db('default', SNAPSHOT_FIELDS, snapshot['user'])
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        token = Token.from_db('default', ['key', 'user_id', 'created'], snapshot['token'])
+        token.user = user
+        return user, token
+
+
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """
+    Сбрасывает снимки токенов пользователя после его сохранения
+    """
+    keys = Token.objects.filter(user_id=instance.id).values_list('key', flat=True)
+    AUTH_CACHE.delete_many([token_cache_key(key) for key in keys])
+
+
+def invalidate_token(sender, instance, **kwargs):
+    """
+    Сбрасывает снимок удаленного токена
+    """
+    AUTH_CACHE.delete(token_cache_key(instance.key))
@@ -0,0 +1,138 @@
+"""
+Изменение корзины пачкой: проверка всех позиций одним запросом и запись одним запросом
+"""
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from inetshop.models import Order, OrderItem, ProductInfo
+
+# позиций в одном INSERT, чтобы не упереться в лимит параметров запроса
+BASKET_BATCH_SIZE = 1000
+
+
+def parse_basket_items(items, key='product_info', merge=True):
+    """
+    Разбирает позиции запроса в словарь id -> количество и словарь ошибок номер позиции -> текст.
+    Повторяющиеся позиции складываются, а при merge=False действует последняя
+    """
+    quantities = {}
+    errors = {}
+    if not isinstance(items, list):
+        return quantities, {'items': 'Ожидается список позиций/List of items expected'}
+    for number, item in enumerate(items):
+        item_id = item.get(key) if isinstance(item, dict) else None
+        quantity = item.get('quantity') if isinstance(item, dict) else None
+        if type(item_id) is not int or type(quantity) is not int:
+            errors[str(number)] = f'Нужны целые {key} и quantity/Integer {key} and quantity required'
+        elif quantity < 1:
+            errors[str(number)] = 'Количество должно быть больше нуля/Quantity must be positive'
+        else:
+            quantities[item_id] = quantities.get(item_id, 0) + quantity if merge else quantity
+    return quantities, errors
+
+
+def add_basket_items(basket, items):
+    """
+    Добавляет позиции в корзину. Все предложения и остатки проверяются одним запросом
+    с учетом того, что уже лежит в корзине, затем все позиции записываются одним
+    INSERT ... ON CONFLICT DO UPDATE, который прибавляет количество к существующим строкам.
+    Возвращает (число записанных позиций, ошибки); при ошибках корзина не меняется
+    """
+    quantities, errors = parse_basket_items(items)
+    if errors or not quantities:
+        return 0, errors
+
+    in_basket = OrderItem.objects.filter(order_id=basket.id, product_info_id=OuterRef('id')).values('quantity')
+    # id -> (остаток, уже в корзине, магазин)
+    stock = {row[0]: row[1:] for row in ProductInfo.objects.filter(
+        id__in=quantities, is_active=True, shop__state=True).annotate(
+        in_basket=Coalesce(Subquery(in_basket), Value(0))).values_list('id', 'quantity', 'in_basket', 'shop_id')}
+
+    for info_id, quantity in quantities.items():
+        if info_id not in stock:
+            errors[str(info_id)] = 'Товар не найден или снят с продажи/Product is not available'
+        elif stock[info_id][1] + quantity > stock[info_id][0]:
+            errors[str(info_id)] = f'Доступно только {stock[info_id][0]}/Only {stock[info_id][0]} available'
+    if errors:
+        return 0, errors
+
+    with transaction.atomic():
+        rows = [(info_id, quantity, stock[info_id][2]) for info_id, quantity in quantities.items()]
+        for start in range(0, len(rows), BASKET_BATCH_SIZE):
+            _upsert_items(basket.id, rows[start:start + BASKET_BATCH_SIZE])
+        refresh_order_totals(basket.id)
+    return len(quantities), errors
+
+
+def update_basket_items(basket, items):
+    """
+    Меняет количество в позициях корзины. Позиции и остатки по ним читаются одним запросом,
+    все подходящие позиции обновляются одним UPDATE ... CASE WHEN в пределах этой корзины.
+    Возвращает (число обновленных позиций, результат по каждой позиции)
+    """
+    quantities, errors = parse_basket_items(items, key='id', merge=False)
+    # позиции, которые не удалось разобрать, указываются по номеру в запросе
+    results = [{'item': number, 'Status': False, 'Errors': error} for number, error in errors.items()]
+
+    lines = {line_id: (stock, is_active) for line_id, stock, is_active in OrderItem.objects.filter(
+        order_id=basket.id, id__in=quantities).values_list('id', 'product_info__quantity', 'product_info__is_active')}
+
+    updates = {}
+    for line_id, quantity in quantities.items():
+        if line_id not in lines:
+            results.append({'id': line_id, 'Status': False, 'Errors': 'Позиция не найдена в корзине/Item not in basket'})
+        elif not lines[line_id][1]:
+            results.append({'id': line_id, 'Status': False, 'Errors': 'Товар снят с продажи/Product is not available'})
+        elif quantity > lines[line_id][0]:
+            results.append({'id': line_id, 'Status': False,
+                            'Errors': f'Доступно только {lines[line_id][0]}/Only {lines[line_id][0]} available'})
+        else:
+            updates[line_id] = quantity
+            results.append({'id': line_id, 'Status': True, 'quantity': quantity})
+
+    updated = 0
+    if updates:
+        updated = OrderItem.objects.filter(order_id=basket.id, id__in=updates).update(quantity=Case(
+            *(When(id=line_id, then=Value(quantity)) for line_id, quantity in updates.items()),
+            output_field=IntegerField()))
+        refresh_order_totals(basket.id)
+    return updated, results
+
+
+def refresh_order_totals(order_id):
+    """
+    Пересчитывает сумму и число товаров заказа одним UPDATE по его позициям.
+    Пока цена позиции не зафиксирована (корзина), берется текущая цена предложения
+    """
+    _update_totals(Order.objects.filter(id=order_id))
+
+
+def refresh_basket_totals(info_ids):
+    """
+    Пересчитывает суммы корзин с этими предложениями одним UPDATE, например после смены цен в прайсе
+    """
+    return _update_totals(Order.objects.filter(
+        state='basket', id__in=OrderItem.objects.filter(product_info_id__in=info_ids).values('order_id')))
+
+
+def _update_totals(orders):
+    lines = OrderItem.objects.filter(order_id=OuterRef('id')).order_by().values('order_id')
+    line_sum = F('quantity') * Coalesce('price', 'product_info__price')
+    return orders.update(
+        total_sum=Coalesce(Subquery(lines.annotate(total=Sum(line_sum)).values('total')), 0),
+        items_count=Coalesce(Subquery(lines.annotate(count=Sum('quantity')).values('count')), 0))
+
+
+def _upsert_items(order_id, rows):
+    quote = connection.ops.quote_name
+    table = quote(OrderItem._meta.db_table)
+    order, product_info, quantity, shop, order_state = (
+        quote(OrderItem._meta.get_field(name).column)
+        for name in ('order', 'product_info', 'quantity', 'shop', 'order_state'))
+    values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({order}, {product_info}, {quantity}, {shop}, {order_state}) VALUES {values} '
+            f'ON CONFLICT ({order}, {product_info}) DO UPDATE SET {quantity} = {table}.{quantity} + excluded.{quantity}',
+            [value for info_id, count, shop_id in rows for value in (order_id, info_id, count, shop_id, 'basket')])
@@ -0,0 +1,177 @@
+"""
+Кэш каталога с версиями и ETag.
+Версия каталога (общая и по магазину) меняется после каждой загрузки прайса,
+поэтому старые ответы не удаляются явно, а просто перестают запрашиваться и вытесняются по LRU/TTL.
+Версия остатков меняется при оформлении и отмене заказов и учитывается только ответами с остатками.
+Версия пользователя меняется при изменении его корзины и заказов
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import caches
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+
+CATALOG_CACHE = 'catalog'
+
+
+def _version_key(shop_id=None):
+    return f'catalog:version:{shop_id or "all"}'
+
+
+def _new_version():
+    # версия из времени не совпадет с прежней, даже если ключ версии был вытеснен из кэша
+    return time.time_ns() // 1000
+
+
+def catalog_version(shop_id=None):
+    cache = caches[CATALOG_CACHE]
+    key = _version_key(shop_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_catalog_version(shop_id=None):
+    """
+    Делает устаревшими ответы каталога: общие и, если указан магазин, по этому магазину
+    """
+    cache = caches[CATALOG_CACHE]
+    for key in {_version_key(), _version_key(shop_id)}:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), timeout=None)
+
+
+def _stock_version_key(shop_id=None):
+    return f'stock:version:{shop_id or "all"}'
+
+
+def stock_version(shop_id=None):
+    """
+    Версия остатков предложений: общая или по магазину
+    """
+    cache = caches[CATALOG_CACHE]
+    key = _stock_version_key(shop_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_stock_version(shop_id):
+    """
+    Делает устаревшими ответы с остатками магазина после оформления или отмены заказа.
+    Версия каталога не меняется: ответы без остатков и ETag корзин остаются действительными
+    """
+    cache = caches[CATALOG_CACHE]
+    for key in {_stock_version_key(), _stock_version_key(shop_id)}:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), timeout=None)
+
+
+def _user_version_key(user_id):
+    return f'user:version:{user_id}'
+
+
+def user_version(user_id):
+    """
+    Версия корзины и заказов пользователя
+    """
+    cache = caches[CATALOG_CACHE]
+    key = _user_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_version(user_id):
+    """
+    Вызывается при каждом изменении корзины или заказов пользователя
+    """
+    cache = caches[CATALOG_CACHE]
+    try:
+        cache.incr(_user_version_key(user_id))
+    except ValueError:
+        cache.set(_user_version_key(user_id), _new_version(), timeout=None)
+
+
+def catalog_cache_key(request, shop_id=None, with_stock=False):
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    version = catalog_version(shop_id)
+    if with_stock:
+        version = f'{version}.{stock_version(shop_id)}'
+    return f'catalog:{shop_id or "all"}:{version}:{url}'
+
+
+def make_etag(*parts):
+    """
+    Сильный ETag из версий данных, без хэширования тела ответа
+    """
+    return '"%s"' % hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def not_modified(request, etag):
+    """
+    Возвращает ответ 304, если у клиента уже есть версия с этим ETag
+    """
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return Response(status=304, headers={'ETag': etag})
+    return None
+
+
+def user_etag(method):
+    """
+    Условный GET для корзины и заказов: ETag из версии данных пользователя и версии каталога,
+    ответ 304 отдается до запросов к заказам
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return method(self, request, *args, **kwargs)
+
+        etag = make_etag(request.get_full_path(), request.user.id, user_version(request.user.id), catalog_version())
+        response = not_modified(request, etag)
+        if response is None:
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+        return response
+    return wrapper
+
+
+class CatalogCacheMixin:
+    """
+    Отдает сериализованный ответ GET из кэша, пока не изменится версия каталога,
+    и отвечает 304 на If-None-Match с текущим ETag, не обращаясь к базе.
+    Ответ строит метод list представления. Запросы с shop_id зависят только от версии этого магазина
+    """
+    # ответ содержит остатки: ключ зависит и от версии остатков
+    with_stock = False
+
+    def get(self, request, *args, **kwargs):
+        cache = caches[CATALOG_CACHE]
+        key = catalog_cache_key(request, request.query_params.get('shop_id'), self.with_stock)
+        etag = make_etag(key)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, headers={'ETag': etag})
+
+        response = self.list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data)
+            response['ETag'] = etag
+        return response
@@ -0,0 +1,154 @@
+"""
+Денормализованные документы предложений и заказов для быстрого чтения
+"""
+from django.utils import timezone
+from rest_framework.fields import DateTimeField
+
+from inetshop.models import ProductInfo, ProductParameter, CatalogOffer, Order, OrderItem, Contact
+from inetshop.search import build_search_text
+
+# поля CatalogOffer, которые перезаписываются при пересборке
+DOCUMENT_FIELDS = ('shop_id', 'category_id', 'product_id', 'price', 'quantity', 'is_active', 'updated_at',
+                   'document', 'search_text')
+
+DOCUMENT_BATCH_SIZE = 1000
+
+# поля контакта в ответе, как у ContactSerializer
+CONTACT_FIELDS = ('id', 'city', 'street', 'house', 'structure', 'building', 'apartment', 'phone')
+
+DATETIME_FIELD = DateTimeField()
+
+
+def build_offer_documents(info_ids):
+    """
+    Собирает документы предложений в том же виде, что и ProductInfoSerializer,
+    двумя запросами values() без сериализаторов. Возвращает словарь id -> (строка, документ)
+    """
+    parameters = {}
+    for info_id, name, value in ProductParameter.objects.filter(product_info_id__in=info_ids).values_list(
+            'product_info_id', 'parameter__name', 'value').order_by('id'):
+        parameters.setdefault(info_id, []).append({'parameter': name, 'value': value})
+
+    documents = {}
+    for row in ProductInfo.objects.filter(id__in=info_ids).values(
+            'id', 'model', 'shop_id', 'quantity', 'price', 'price_rrc', 'is_active',
+            'product_id', 'product__name', 'product__category_id', 'product__category__name'):
+        documents[row['id']] = (row, {
+            'id': row['id'],
+            'product': {'name': row['product__name'], 'category': row['product__category__name']},
+            'model': row['model'],
+            'shop': row['shop_id'],
+            'quantity': row['quantity'],
+            'price': row['price'],
+            'price_rrc': row['price_rrc'],
+            'product_parameters': parameters.get(row['id'], []),
+        })
+    return documents
+
+
+def rebuild_offer_documents(info_ids):
+    """
+    Пересобирает документы указанных предложений одной вставкой с обновлением на пачку
+    """
+    info_ids = list(info_ids)
+    now = timezone.now()
+    for start in range(0, len(info_ids), DOCUMENT_BATCH_SIZE):
+        documents = build_offer_documents(info_ids[start:start + DOCUMENT_BATCH_SIZE])
+        CatalogOffer.objects.bulk_create(
+            [CatalogOffer(product_info_id=info_id,
+                          shop_id=row['shop_id'],
+                          category_id=row['product__category_id'],
+                          product_id=row['product_id'],
+                          price=row['price'],
+                          quantity=row['quantity'],
+                          is_active=row['is_active'],
+                          updated_at=now,
+                          document=document,
+                          search_text=build_search_text(document))
+             # строки пишутся в порядке id, чтобы встречные пересборки не взаимоблокировались
+             for info_id, (row, document) in sorted(documents.items())],
+            update_conflicts=True, unique_fields=['product_info'], update_fields=DOCUMENT_FIELDS)
+
+
+def build_order_summaries(orders):
+    """
+    Краткий вид заказов для истории: без позиций, сумма и число товаров берутся из заказа
+    """
+    return [{'id': row['id'],
+             'state': row['state'],
+             'dt': DATETIME_FIELD.to_representation(row['dt']),
+             'total_sum': row['total_sum'],
+             'items_count': row['items_count']}
+            for row in orders.values('id', 'state', 'dt', 'total_sum', 'items_count')]
+
+
+def build_order_documents(orders):
+    """
+    Собирает заказы в том же виде, что и OrderSerializer, запросами values() без сериализаторов.
+    Сумма и число товаров хранятся в заказе, агрегировать позиции не нужно
+    """
+    order_rows = list(orders.values('id', 'state', 'dt', 'total_sum', 'items_count', 'contact_id'))
+    order_ids = [row['id'] for row in order_rows]
+
+    items = {}
+    info_ids = set()
+    for row in OrderItem.objects.filter(order_id__in=order_ids).values(
+            'id', 'order_id', 'product_info_id', 'quantity', 'price').order_by('id'):
+        items.setdefault(row['order_id'], []).append(row)
+        info_ids.add(row['product_info_id'])
+    offers = build_offer_documents(info_ids)
+
+    contacts = {row['id']: row for row in Contact.objects.filter(
+        id__in={row['contact_id'] for row in order_rows if row['contact_id']}).values(*CONTACT_FIELDS)}
+
+    documents = []
+    for row in order_rows:
+        order_items = items.get(row['id'], [])
+        documents.append({
+            'id': row['id'],
+            'ordered_items': [{'id': item['id'],
+                               'product_info': offers[item['product_info_id']][1],
+                               'quantity': item['quantity'],
+                               'price': item['price']} for item in order_items],
+            'state': row['state'],
+            'dt': DATETIME_FIELD.to_representation(row['dt']),
+            'total_sum': row['total_sum'],
+            'items_count': row['items_count'],
+            'contact': contacts.get(row['contact_id']),
+        })
+    return documents
+
+
+def build_shop_order_documents(shop_id, order_ids):
+    """
+    Заказы для ленты магазина: только позиции этого магазина и сумма по ним, в порядке order_ids
+    """
+    items = {}
+    info_ids = set()
+    for row in OrderItem.objects.filter(order_id__in=order_ids, shop_id=shop_id).values(
+            'id', 'order_id', 'product_info_id', 'quantity', 'price', 'order_state', 'order_dt').order_by('id'):
+        items.setdefault(row['order_id'], []).append(row)
+        info_ids.add(row['product_info_id'])
+    offers = build_offer_documents(info_ids)
+
+    orders = {row['id']: row for row in Order.objects.filter(id__in=order_ids).values('id', 'contact_id')}
+    contacts = {row['id']: row for row in Contact.objects.filter(
+        id__in={row['contact_id'] for row in orders.values() if row['contact_id']}).values(*CONTACT_FIELDS)}
+
+    documents = []
+    for order_id in order_ids:
+        order_items = items.get(order_id, [])
+        if not order_items:
+            continue
+        documents.append({
+            'id': order_id,
+            'ordered_items': [{'id': item['id'],
+                               'product_info': offers[item['product_info_id']][1],
+                               'quantity': item['quantity'],
+                               'price': item['price']} for item in order_items],
+            'state': order_items[0]['order_state'],
+            'dt': DATETIME_FIELD.to_representation(order_items[0]['order_dt']),
+            'total_sum': sum(item['quantity'] * item['price'] for item in order_items),
+            'contact': contacts.get(orders[order_id]['contact_id']),
+        })
+    return documents
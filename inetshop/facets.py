@@ -0,0 +1,104 @@
+"""
+Фильтры по параметрам товаров с подсчетом предложений по значениям.
+Для каждого магазина строится обратный индекс (параметр, значение) -> id предложений
+по документам CatalogOffer. Индекс магазина хранится в кэше каталога под версией этого магазина
+и пересобирается после загрузки его прайса, индексы остальных магазинов не трогаются.
+Фильтры выполняются пересечением множеств, без соединений с ProductParameter
+"""
+from django.core.cache import caches
+
+from inetshop.cache import CATALOG_CACHE, catalog_version
+from inetshop.models import CatalogOffer
+
+# индексы, уже загруженные в этот процесс: id магазина -> (версия, индекс)
+_loaded = {}
+
+
+def _facets_key(shop_id, version):
+    return f'facets:{shop_id}:{version}'
+
+
+def build_shop_facets(shop_id):
+    """
+    Строит индекс предложений магазина, которые есть в продаже
+    """
+    offers = set()
+    categories = {}
+    postings = {}
+    for info_id, category_id, document in CatalogOffer.objects.filter(
+            shop_id=shop_id, is_active=True).values_list('product_info_id', 'category_id', 'document').iterator():
+        offers.add(info_id)
+        categories.setdefault(category_id, set()).add(info_id)
+        for parameter in document['product_parameters']:
+            postings.setdefault((parameter['parameter'], parameter['value']), set()).add(info_id)
+    return {'offers': offers, 'categories': categories, 'postings': postings}
+
+
+def rebuild_shop_facets(shop_id):
+    """
+    Пересобирает индекс магазина под его текущей версией каталога. Вызывается после загрузки прайса
+    """
+    version = catalog_version(shop_id)
+    facets = build_shop_facets(shop_id)
+    caches[CATALOG_CACHE].set(_facets_key(shop_id, version), facets)
+    _loaded[shop_id] = (version, facets)
+    return facets
+
+
+def shop_facets(shop_id):
+    version = catalog_version(shop_id)
+    loaded = _loaded.get(shop_id)
+    if loaded is not None and loaded[0] == version:
+        return loaded[1]
+
+    facets = caches[CATALOG_CACHE].get(_facets_key(shop_id, version))
+    if facets is None:
+        return rebuild_shop_facets(shop_id)
+    _loaded[shop_id] = (version, facets)
+    return facets
+
+
+def parse_facet_filters(values):
+    """
+    Разбирает параметры запроса вида "Цвет=красный" в словарь параметр -> множество значений
+    """
+    selected = {}
+    for value in values:
+        name, separator, parameter_value = value.partition('=')
+        if not separator or not name:
+            raise ValueError(f'Фильтр должен иметь вид параметр=значение/Filter must be name=value: {value}')
+        selected.setdefault(name, set()).add(parameter_value)
+    return selected
+
+
+def filter_offers(shop_ids, selected, category_id=None):
+    """
+    Возвращает id предложений магазинов, подходящих под фильтры:
+    значения одного параметра объединяются по ИЛИ, разные параметры - по И
+    """
+    found = set()
+    for shop_id in shop_ids:
+        facets = shop_facets(shop_id)
+        if category_id is None:
+            offers = facets['offers']
+        else:
+            offers = facets['categories'].get(category_id, set())
+        # начинаем с самого узкого множества, чтобы промежуточные пересечения были меньше
+        matches = sorted((set().union(*(facets['postings'].get((name, value), ()) for value in values))
+                          for name, values in selected.items()), key=len)
+        found |= offers.intersection(*matches)
+    return found
+
+
+def facet_counts(shop_ids, offer_ids):
+    """
+    Число предложений из offer_ids по каждому значению каждого параметра
+    """
+    counts = {}
+    for shop_id in shop_ids:
+        for (name, value), posting in shop_facets(shop_id)['postings'].items():
+            count = len(posting & offer_ids)
+            if count:
+                values = counts.setdefault(name, {})
+                values[value] = values.get(value, 0) + count
+    return counts
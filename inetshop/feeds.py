@@ -0,0 +1,154 @@
+"""
+Потоковая загрузка и чтение прайс-листов поставщиков
+"""
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
+
+import yaml
+from requests import get
+from yaml.events import AliasEvent, MappingEndEvent, MappingStartEvent, ScalarEvent, SequenceEndEvent, \
+    SequenceStartEvent
+from yaml.nodes import ScalarNode
+
+try:
+    # libyaml заметно быстрее парсера на чистом Python
+    from yaml import CSafeLoader as FeedLoader
+except ImportError:
+    from yaml import SafeLoader as FeedLoader
+
+# скачанный прайс-лист: путь к временному файлу и валидаторы для следующей загрузки
+FeedDownload = namedtuple('FeedDownload', ('path', 'etag', 'last_modified', 'content_hash'))
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def download_price_list(url, etag='', last_modified='', timeout=60):
+    """
+    Скачивает прайс-лист по ссылке во временный файл, не загружая его в память.
+    Запрос условный (If-None-Match/If-Modified-Since): если прайс не изменился, возвращает None.
+    Удалить временный файл должен вызывающий код
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    with get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(prefix='price_list_', suffix='.yaml', delete=False) as fh:
+            try:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    fh.write(chunk)
+            except BaseException:
+                # обрыв посреди загрузки: недокачанный файл никому не нужен
+                fh.close()
+                os.remove(fh.name)
+                raise
+
+        return FeedDownload(fh.name, response.headers.get('ETag', ''), response.headers.get('Last-Modified', ''),
+                            digest.hexdigest())
+
+
+def read_price_list(stream):
+    """
+    Читает прайс-лист из потока по событиям YAML, не строя документ целиком.
+    Возвращает пары (ключ, значение) верхнего уровня, элементы goods отдаются по одному
+    как ('goods', item), поэтому память не зависит от размера прайса
+    """
+    loader = FeedLoader(stream)
+    try:
+        while not loader.check_event(MappingStartEvent):
+            if loader.check_event(ScalarEvent, SequenceStartEvent, AliasEvent):
+                raise yaml.YAMLError('Прайс-лист должен быть словарем/Price list must be a mapping')
+            loader.get_event()
+        loader.get_event()
+
+        while not loader.check_event(MappingEndEvent):
+            key = _read_value(loader)
+            if key == 'goods' and loader.check_event(SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(SequenceEndEvent):
+                    yield 'goods', _read_value(loader)
+                loader.get_event()
+            else:
+                yield key, _read_value(loader)
+    finally:
+        loader.dispose()
+
+
+def count_goods(stream):
+    """
+    Считает товары в прайс-листе только по событиям парсера, не создавая объектов
+    """
+    loader = FeedLoader(stream)
+    count = 0
+    depth = 0
+    is_key = True
+    key = None
+    try:
+        while loader.check_event():
+            event = loader.get_event()
+            if isinstance(event, (MappingEndEvent, SequenceEndEvent)):
+                depth -= 1
+                is_key = is_key or depth == 1
+                continue
+            if not isinstance(event, (ScalarEvent, AliasEvent, MappingStartEvent, SequenceStartEvent)):
+                continue
+            if depth == 1:
+                if is_key:
+                    key, is_key = event.value, False
+                    continue
+                is_key = isinstance(event, (ScalarEvent, AliasEvent))
+            elif depth == 2 and key == 'goods':
+                count += 1
+            if isinstance(event, (MappingStartEvent, SequenceStartEvent)):
+                depth += 1
+    finally:
+        loader.dispose()
+    return count
+
+
+def iter_price_list(data):
+    """
+    Представляет уже загруженный прайс-лист в том же виде, что и read_price_list
+    """
+    for key, value in data.items():
+        if key == 'goods':
+            for item in value:
+                yield 'goods', item
+        else:
+            yield key, value
+
+
+def _read_value(loader):
+    event = loader.get_event()
+    if isinstance(event, ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(ScalarNode, event.value, event.implicit)
+        node = ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+        # конструктор вызываем напрямую: construct_object кэширует каждый узел до конца документа
+        constructor = loader.yaml_constructors.get(tag, loader.yaml_constructors[None])
+        return constructor(loader, node)
+    if isinstance(event, SequenceStartEvent):
+        items = []
+        while not loader.check_event(SequenceEndEvent):
+            items.append(_read_value(loader))
+        loader.get_event()
+        return items
+    if isinstance(event, MappingStartEvent):
+        mapping = {}
+        while not loader.check_event(MappingEndEvent):
+            key = _read_value(loader)
+            mapping[key] = _read_value(loader)
+        loader.get_event()
+        return mapping
+    raise yaml.YAMLError(f'Неподдерживаемый элемент прайс-листа/Unsupported price list element: {event}')
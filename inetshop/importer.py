@@ -0,0 +1,294 @@
+"""
+Импорт прайс-листов поставщиков
+"""
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from inetshop.basket import refresh_basket_totals
+from inetshop.cache import bump_catalog_version
+from inetshop.documents import rebuild_offer_documents
+from inetshop.facets import rebuild_shop_facets
+from inetshop.feeds import iter_price_list
+from inetshop.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter
+
+# размер пачки для bulk_create и запросов IN (...)
+IMPORT_BATCH_SIZE = getattr(settings, 'PARTNER_IMPORT_BATCH_SIZE', 1000)
+
+# поля предложения, изменение которых считается обновлением
+OFFER_FIELDS = ('product_id', 'model', 'price', 'price_rrc', 'quantity', 'is_active')
+PRICE_INDEX = OFFER_FIELDS.index('price')
+
+
+def chunked(items, size):
+    """
+    Разбивает последовательность на пачки по size элементов
+    """
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class PriceListImporter:
+    """
+    Загрузка прайс-листа поставщика.
+    Товары обрабатываются пачками фиксированного размера: справочники разрешаются несколькими
+    запросами IN (...) в словари имя -> id, предложения синхронизируются с прайсом по ключу
+    (магазин, внешний ИД), документы затронутых предложений пересобираются.
+    Весь импорт выполняется в одной транзакции
+    """
+
+    def __init__(self, batch_size=None, progress=None, shop_id=None, user_id=None):
+        self.batch_size = batch_size or IMPORT_BATCH_SIZE
+        # вызывается после каждой пачки с числом обработанных товаров
+        self.progress = progress
+        # прайс загружает партнер: только в свой магазин, а если магазина еще нет - в новый
+        self.shop_id = shop_id
+        self.user_id = user_id
+        self.parameter_ids = {}
+
+    def run(self, data):
+        """
+        Импорт уже загруженного прайс-листа
+        """
+        return self.run_stream(iter_price_list(data))
+
+    def run_stream(self, records):
+        """
+        Импорт прайс-листа из последовательности пар (ключ, значение), см. inetshop.feeds
+        """
+        started = time.monotonic()
+        summary = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'removed': 0}
+        seen = set()
+        shop = None
+        batch = []
+
+        with transaction.atomic():
+            for key, value in records:
+                if key == 'shop':
+                    shop = self.lock_shop(value)
+                elif key == 'categories':
+                    self.import_categories(self._require_shop(shop), value)
+                elif key == 'goods':
+                    self._require_shop(shop)
+                    batch.append(value)
+                    if len(batch) >= self.batch_size:
+                        self.import_batch(shop, batch, seen, summary)
+                        batch = []
+
+            self._require_shop(shop)
+            if batch:
+                self.import_batch(shop, batch, seen, summary)
+            summary['removed'] += self.deactivate_missing(shop, seen)
+
+            if summary['inserted'] or summary['updated'] or summary['removed']:
+                # кэш каталога сбрасываем только после фиксации транзакции
+                transaction.on_commit(partial(bump_catalog_version, shop.id))
+                transaction.on_commit(partial(rebuild_shop_facets, shop.id))
+
+        seconds = time.monotonic() - started
+        return {
+            'shop': shop.name,
+            'shop_id': shop.id,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(summary['rows'] / seconds) if seconds else summary['rows'],
+            **summary,
+        }
+
+    def lock_shop(self, name):
+        """
+        Блокирует строку магазина до конца транзакции,
+        чтобы две загрузки прайса одного магазина не перемешивались. Название магазина уникально,
+        поэтому две первые загрузки одного магазина не создадут его дважды: вторая get_or_create
+        получит IntegrityError и прочитает строку первой.
+        Прайс партнера с чужим магазином отклоняется
+        """
+        if self.shop_id is None:
+            shop, _ = Shop.objects.get_or_create(name=name, defaults={'user_id': self.user_id})
+            if self.user_id is not None and shop.user_id != self.user_id:
+                raise ValueError(f'Прайс-лист другого магазина/Price list of another shop: {name}')
+            return Shop.objects.select_for_update().get(id=shop.id)
+
+        shop = Shop.objects.select_for_update().get(id=self.shop_id)
+        if shop.name != name:
+            raise ValueError(f'Прайс-лист другого магазина/Price list of another shop: {name}')
+        return shop
+
+    @staticmethod
+    def _require_shop(shop):
+        if shop is None:
+            raise ValueError('Магазин должен быть указан в начале прайс-листа/Shop must precede categories and goods')
+        return shop
+
+    def import_batch(self, shop, goods, seen, summary):
+        product_ids = self.resolve_products(goods)
+        parameter_ids = self.resolve_parameters(goods)
+        for key, count in self.sync_offers(shop, goods, product_ids, parameter_ids).items():
+            summary[key] += count
+        summary['rows'] += len(goods)
+        seen.update(item['id'] for item in goods)
+        if self.progress:
+            self.progress(summary['rows'])
+
+    def import_categories(self, shop, categories):
+        """
+        Создаем недостающие категории и привязываем их к магазину
+        """
+        names = {category['id']: category['name'] for category in categories}
+        existing = set()
+        for chunk in chunked(names, self.batch_size):
+            existing.update(Category.objects.filter(id__in=chunk).values_list('id', flat=True))
+
+        Category.objects.bulk_create(
+            [Category(id=category_id, name=name) for category_id, name in names.items()
+             if category_id not in existing],
+            batch_size=self.batch_size, ignore_conflicts=True)
+
+        through = Category.shops.through
+        through.objects.bulk_create(
+            [through(category_id=category_id, shop_id=shop.id) for category_id in names],
+            batch_size=self.batch_size, ignore_conflicts=True)
+
+    def resolve_products(self, goods):
+        """
+        Возвращает словарь (название, категория) -> id продукта, недостающие продукты создаются
+        """
+        keys = {(item['name'], item['category']) for item in goods}
+        product_ids = self._load_products(keys)
+
+        missing = keys - product_ids.keys()
+        if missing:
+            Product.objects.bulk_create(
+                [Product(name=name, category_id=category_id) for name, category_id in missing],
+                batch_size=self.batch_size)
+            product_ids.update(self._load_products(missing))
+        return product_ids
+
+    def _load_products(self, keys):
+        product_ids = {}
+        for chunk in chunked({name for name, _ in keys}, self.batch_size):
+            rows = Product.objects.filter(name__in=chunk).values_list('name', 'category_id', 'id').order_by('id')
+            for name, category_id, product_id in rows:
+                if (name, category_id) in keys:
+                    product_ids.setdefault((name, category_id), product_id)
+        return product_ids
+
+    def resolve_parameters(self, goods):
+        """
+        Возвращает словарь название параметра -> id, недостающие параметры создаются.
+        Имен параметров немного, поэтому словарь переиспользуется между пачками
+        """
+        names = {name for item in goods for name in item['parameters']} - self.parameter_ids.keys()
+        if names:
+            self.parameter_ids.update(self._load_parameters(names))
+            missing = names - self.parameter_ids.keys()
+            if missing:
+                Parameter.objects.bulk_create([Parameter(name=name) for name in missing],
+                                              batch_size=self.batch_size)
+                self.parameter_ids.update(self._load_parameters(missing))
+        return self.parameter_ids
+
+    def _load_parameters(self, names):
+        parameter_ids = {}
+        for chunk in chunked(names, self.batch_size):
+            for name, parameter_id in Parameter.objects.filter(name__in=chunk).values_list('name', 'id').order_by('id'):
+                parameter_ids.setdefault(name, parameter_id)
+        return parameter_ids
+
+    def sync_offers(self, shop, goods, product_ids, parameter_ids):
+        """
+        Сверяет пачку предложений магазина с базой по ключу (магазин, внешний ИД):
+        добавляет новые и обновляет только изменившиеся
+        """
+        incoming = {}
+        for item in goods:
+            fields = (product_ids[(item['name'], item['category'])], str(item['model']),
+                      int(item['price']), int(item['price_rrc']), int(item['quantity']), True)
+            parameters = {parameter_ids[name]: str(value) for name, value in item['parameters'].items()}
+            incoming[item['id']] = (fields, parameters)
+
+        existing = {}
+        for chunk in chunked(incoming, self.batch_size):
+            for row in ProductInfo.objects.filter(shop_id=shop.id, external_id__in=chunk).values_list(
+                    'external_id', 'id', *OFFER_FIELDS):
+                existing[row[0]] = (row[1], row[2:])
+
+        existing_parameters = {}
+        for chunk in chunked([info_id for info_id, _ in existing.values()], self.batch_size):
+            for info_id, parameter_id, value in ProductParameter.objects.filter(
+                    product_info_id__in=chunk).values_list('product_info_id', 'parameter_id', 'value'):
+                existing_parameters.setdefault(info_id, {})[parameter_id] = value
+
+        summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'removed': 0}
+        new_offers = []
+        changed_offers = []
+        repriced = []
+        changed_parameters = {}
+        for external_id, (fields, parameters) in incoming.items():
+            if external_id not in existing:
+                new_offers.append(ProductInfo(shop_id=shop.id, external_id=external_id,
+                                              **dict(zip(OFFER_FIELDS, fields))))
+                changed_parameters[external_id] = parameters
+                continue
+
+            info_id, current = existing[external_id]
+            is_changed = False
+            if current != fields:
+                changed_offers.append(ProductInfo(id=info_id, **dict(zip(OFFER_FIELDS, fields))))
+                is_changed = True
+                if current[PRICE_INDEX] != fields[PRICE_INDEX]:
+                    repriced.append(info_id)
+            if existing_parameters.get(info_id, {}) != parameters:
+                changed_parameters[external_id] = parameters
+                is_changed = True
+            summary['updated' if is_changed else 'unchanged'] += 1
+
+        ProductInfo.objects.bulk_create(new_offers, batch_size=self.batch_size)
+        summary['inserted'] = len(new_offers)
+        ProductInfo.objects.bulk_update(changed_offers, OFFER_FIELDS, batch_size=self.batch_size)
+        if repriced:
+            # суммы корзин считаются по текущим ценам, у оформленных заказов цены зафиксированы
+            refresh_basket_totals(repriced)
+
+        touched = self.replace_parameters(shop, changed_parameters)
+        touched.update(offer.id for offer in changed_offers)
+        rebuild_offer_documents(touched)
+        return summary
+
+    def deactivate_missing(self, shop, seen):
+        """
+        Снимает с продажи предложения магазина, которых не было в прайсе
+        """
+        missing = [info_id for info_id, external_id in ProductInfo.objects.filter(
+            shop_id=shop.id, is_active=True).values_list('id', 'external_id').iterator()
+                   if external_id not in seen]
+        return self.deactivate(missing)
+
+    def deactivate(self, info_ids):
+        # снимаем с продажи, а не удаляем: на предложения ссылаются корзины и заказы
+        deactivated = 0
+        for chunk in chunked(info_ids, self.batch_size):
+            deactivated += ProductInfo.objects.filter(id__in=chunk, is_active=True).update(is_active=False)
+            rebuild_offer_documents(chunk)
+        return deactivated
+
+    def replace_parameters(self, shop, changed_parameters):
+        """
+        Перезаписывает параметры у предложений, для которых они изменились. Возвращает id этих предложений
+        """
+        info_ids = {}
+        for chunk in chunked(changed_parameters, self.batch_size):
+            info_ids.update(ProductInfo.objects.filter(
+                shop_id=shop.id, external_id__in=chunk, is_active=True).values_list('external_id', 'id'))
+
+        for chunk in chunked(info_ids.values(), self.batch_size):
+            ProductParameter.objects.filter(product_info_id__in=chunk).delete()
+
+        ProductParameter.objects.bulk_create(
+            (ProductParameter(product_info_id=info_ids[external_id], parameter_id=parameter_id, value=value)
+             for external_id, parameters in changed_parameters.items()
+             for parameter_id, value in parameters.items()),
+            batch_size=self.batch_size)
+        return set(info_ids.values())
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from inetshop.tasks import app
+
+
+class Command(BaseCommand):
+    help = 'Запуск celery beat с расписанием CELERY_BEAT_SCHEDULE: relay_outbox для каждой очереди писем'
+
+    def handle(self, *args, **options):
+        # Django уже настроен manage.py, поэтому задачи и модели импортируются без ошибок
+        app.start(['beat'])
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inetshop.tasks import app, worker_argv
+
+
+class Command(BaseCommand):
+    help = 'Запуск воркера Celery для одной очереди с ее лимитами из CELERY_QUEUE_LIMITS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queue', choices=list(settings.CELERY_QUEUE_LIMITS))
+
+    def handle(self, *args, **options):
+        app.worker_main(worker_argv(options['queue']))
@@ -0,0 +1,75 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from inetshop.models import ImportJob, Shop
+from inetshop.tasks import import_price_list
+
+
+def init_worker():
+    """
+    Каждый процесс открывает собственное соединение с базой при первом запросе
+    """
+    django.setup()
+    connections.close_all()
+
+
+def import_shop(shop_id, url, user_id):
+    """
+    Загружает прайс одного магазина и возвращает строку отчета.
+    Задача привязана к магазину: прайс с другим названием магазина отклоняется,
+    а неизменившийся прайс пропускается по ETag и хэшу
+    """
+    started = time.monotonic()
+    job = ImportJob.objects.create(source=url, shop_id=shop_id, user_id=user_id)
+    import_price_list(job.id)
+    job.refresh_from_db()
+    return {
+        'shop_id': shop_id,
+        'job': job.id,
+        'state': job.state,
+        'rows': job.processed,
+        'seconds': round(time.monotonic() - started, 3),
+        'errors': job.errors,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Параллельная загрузка прайсов всех магазинов, у которых указана ссылка на прайс'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Число процессов, по умолчанию по числу ядер')
+        parser.add_argument('--shop', type=int, nargs='*', dest='shops', help='Загрузить только указанные магазины')
+
+    def handle(self, *args, workers, shops, **options):
+        queryset = Shop.objects.exclude(url__isnull=True).exclude(url='')
+        if shops:
+            queryset = queryset.filter(id__in=shops)
+        feeds = {shop_id: (url, user_id) for shop_id, url, user_id in queryset.values_list('id', 'url', 'user_id')}
+        names = dict(queryset.values_list('id', 'name'))
+
+        started = time.monotonic()
+        if workers <= 1:
+            report = [import_shop(shop_id, *feed) for shop_id, feed in feeds.items()]
+        else:
+            # соединения родителя не должны достаться дочерним процессам
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+                futures = [executor.submit(import_shop, shop_id, *feed) for shop_id, feed in feeds.items()]
+                report = [future.result() for future in as_completed(futures)]
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(f'{"Магазин":<30} {"Статус":<8} {"Товаров":>8} {"Секунд":>8}')
+        for row in sorted(report, key=lambda row: row['seconds'], reverse=True):
+            self.stdout.write(f'{names[row["shop_id"]]:<30.30} {row["state"]:<8} {row["rows"]:>8} '
+                              f'{row["seconds"]:>8.2f}')
+            for error in row['errors']:
+                self.stderr.write(f'  {error}')
+        self.stdout.write(f'Магазинов: {len(report)}, процессов: {max(workers, 1)}, '
+                          f'общее время: {elapsed:.2f} с, сумма по магазинам: '
+                          f'{sum(row["seconds"] for row in report):.2f} с')
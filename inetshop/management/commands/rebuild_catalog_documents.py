@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from inetshop.cache import bump_catalog_version
+from inetshop.documents import DOCUMENT_BATCH_SIZE, rebuild_offer_documents
+from inetshop.models import ProductInfo, Shop
+
+
+class Command(BaseCommand):
+    help = 'Полная пересборка документов предложений каталога, например после развертывания'
+
+    def handle(self, *args, **options):
+        rebuilt = 0
+        batch = []
+        for info_id in ProductInfo.objects.order_by('id').values_list('id', flat=True).iterator():
+            batch.append(info_id)
+            if len(batch) == DOCUMENT_BATCH_SIZE:
+                rebuild_offer_documents(batch)
+                rebuilt += len(batch)
+                batch = []
+        rebuild_offer_documents(batch)
+        rebuilt += len(batch)
+
+        # фильтры по параметрам хранятся под версиями магазинов
+        for shop_id in Shop.objects.values_list('id', flat=True):
+            bump_catalog_version(shop_id)
+        self.stdout.write(f'Пересобрано документов: {rebuilt}')
@@ -1,7 +1,9 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.cache import cache
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_rest_passwordreset.tokens import get_token_generator
 
@@ -15,6 +17,20 @@ STATE_CHOICES = (
     ('canceled', 'Отменен'),
 )
 
+IMPORT_STATE_CHOICES = (
+    ('pending', 'В очереди'),
+    ('running', 'Выполняется'),
+    ('done', 'Завершен'),
+    ('skipped', 'Прайс не изменился'),
+    ('failed', 'Ошибка'),
+)
+
+OUTBOX_STATE_CHOICES = (
+    ('pending', 'Ожидает отправки'),
+    ('sent', 'Отправлено'),
+    ('dead', 'Не доставлено'),
+)
+
 USER_TYPE_CHOICES = (
     ('shop', 'Магазин'),
     ('buyer', 'Покупатель'),
@@ -97,12 +113,17 @@ class User(AbstractUser):
 
 
 class Shop(models.Model):
-    name = models.CharField(max_length=50, verbose_name='Название')
+    # по названию из прайса импорт находит магазин, см. PriceListImporter.lock_shop
+    name = models.CharField(max_length=50, verbose_name='Название', unique=True)
     url = models.URLField(verbose_name='Ссылка', null=True, blank=True)
     user = models.OneToOneField(User, verbose_name='Пользователь',
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
     state = models.BooleanField(verbose_name='статус получения заказов', default=True)
+    # валидаторы последней загруженной версии прайса по ссылке
+    feed_etag = models.CharField(verbose_name='ETag прайса', max_length=255, blank=True)
+    feed_last_modified = models.CharField(verbose_name='Last-Modified прайса', max_length=64, blank=True)
+    feed_hash = models.CharField(verbose_name='Хэш прайса', max_length=64, blank=True)
 
     # filename
 
@@ -152,12 +173,15 @@ class ProductInfo(models.Model):
     quantity = models.PositiveIntegerField(verbose_name='Количество')
     price = models.PositiveIntegerField(verbose_name='Цена')
     price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    is_active = models.BooleanField(verbose_name='Есть в прайсе поставщика', default=True)
 
     class Meta:
         verbose_name = 'Информация о продукте'
         verbose_name_plural = "Информационный список о продуктах"
         constraints = [
             models.UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
+            # ключ синхронизации с прайсом, его индекс используется при поиске предложений пачки
+            models.UniqueConstraint(fields=['shop', 'external_id'], name='unique_shop_external_id'),
         ]
 
 
@@ -189,6 +213,91 @@ class ProductParameter(models.Model):
         ]
 
 
+class CatalogOffer(models.Model):
+    """
+    Готовый к отдаче документ предложения, пересобирается при загрузке прайса
+    """
+    product_info = models.OneToOneField(ProductInfo, verbose_name='Информация о продукте', primary_key=True,
+                                        related_name='catalog_offer', on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='catalog_offers',
+                             on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='catalog_offers',
+                                 on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, verbose_name='Продукт', related_name='catalog_offers',
+                                on_delete=models.CASCADE)
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    is_active = models.BooleanField(verbose_name='Есть в прайсе поставщика', default=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    document = models.JSONField(verbose_name='Документ')
+    # название, модель и значения параметров для полнотекстового поиска, см. inetshop.search
+    search_text = models.TextField(verbose_name='Текст для поиска', blank=True, default='')
+
+    class Meta:
+        verbose_name = 'Документ предложения'
+        verbose_name_plural = "Документы предложений"
+        # под фильтры и сортировку по цене в ProductInfoView
+        indexes = [
+            models.Index(fields=['shop', 'price'], name='catalog_offer_shop_price'),
+            models.Index(fields=['category', 'price'], name='catalog_offer_category_price'),
+            models.Index(fields=['price'], condition=models.Q(quantity__gt=0), name='catalog_offer_in_stock_price'),
+        ]
+
+
+class ImportJob(models.Model):
+    user = models.ForeignKey(User, verbose_name='Пользователь',
+                             related_name='import_jobs', blank=True, null=True,
+                             on_delete=models.SET_NULL)
+    # магазин партнера: прайс другого магазина в эту задачу не загрузится
+    shop = models.ForeignKey(Shop, verbose_name='Магазин',
+                             related_name='import_jobs', blank=True, null=True,
+                             on_delete=models.SET_NULL)
+    source = models.CharField(max_length=255, verbose_name='Источник прайса')
+    state = models.CharField(verbose_name='Статус', choices=IMPORT_STATE_CHOICES, max_length=10, default='pending')
+    processed = models.PositiveIntegerField(verbose_name='Обработано товаров', default=0)
+    total = models.PositiveIntegerField(verbose_name='Всего товаров', null=True, blank=True)
+    errors = models.JSONField(verbose_name='Ошибки', default=list, blank=True)
+    statistics = models.JSONField(verbose_name='Статистика', default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Загрузка прайса'
+        verbose_name_plural = "Список загрузок прайсов"
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'{self.source} {self.state}'
+
+    @property
+    def is_remote(self):
+        return self.source.startswith(('http://', 'https://'))
+
+    @property
+    def progress_key(self):
+        return f'import-job:{self.id}:processed'
+
+    def report_progress(self, processed):
+        """
+        Импорт идет в одной транзакции, поэтому ход выполнения пишем в кэш, а не в таблицу
+        """
+        cache.set(self.progress_key, processed, timeout=24 * 60 * 60)
+
+    @property
+    def current_processed(self):
+        if self.state == 'running':
+            return cache.get(self.progress_key, self.processed)
+        return self.processed
+
+    @property
+    def duration(self):
+        if self.started_at is None:
+            return None
+        finished_at = self.finished_at or timezone.now()
+        return round((finished_at - self.started_at).total_seconds(), 3)
+
+
 class Contact(models.Model):
     user = models.ForeignKey(User, verbose_name='Пользователь',
                              related_name='contacts', blank=True,
@@ -219,11 +328,18 @@ class Order(models.Model):
     contact = models.ForeignKey(Contact, verbose_name='Контакт',
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
+    # поддерживаются при изменении позиций, см. inetshop.basket.refresh_order_totals
+    total_sum = models.PositiveIntegerField(verbose_name='Сумма', default=0)
+    items_count = models.PositiveIntegerField(verbose_name='Количество товаров', default=0)
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = "Список заказ"
         ordering = ('-dt',)
+        indexes = [
+            # история заказов покупателя по статусу и дате
+            models.Index(fields=['user', 'state', 'dt'], name='order_user_state_dt'),
+        ]
 
     def __str__(self):
         return str(self.dt)
@@ -242,6 +358,14 @@ class OrderItem(models.Model):
                                      blank=True,
                                      on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
+    # цена за единицу на момент оформления, у позиций корзины не заполнена
+    price = models.PositiveIntegerField(verbose_name='Цена', blank=True, null=True)
+    # копии магазина предложения и статуса и даты заказа для ленты заказов магазина, см. inetshop.orders
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='ordered_items', blank=True, null=True,
+                             on_delete=models.SET_NULL)
+    order_state = models.CharField(verbose_name='Статус заказа', choices=STATE_CHOICES, max_length=15,
+                                   default='basket')
+    order_dt = models.DateTimeField(verbose_name='Дата заказа', blank=True, null=True)
 
     class Meta:
         verbose_name = 'Заказанная позиция'
@@ -249,6 +373,9 @@ class OrderItem(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['order_id', 'product_info'], name='unique_order_item'),
         ]
+        indexes = [
+            models.Index(fields=['shop', 'order_state', 'order_dt'], name='order_item_shop_state_dt'),
+        ]
 
 
 class ConfirmEmailToken(models.Model):
@@ -288,3 +415,36 @@ class ConfirmEmailToken(models.Model):
 
     def __str__(self):
         return "Password reset token for user {user}".format(user=self.user)
+
+
+class OutboxMessage(models.Model):
+    """
+    Уведомление, записанное в одной транзакции с изменением заказа или созданием токена.
+    Отправляет его relay_outbox уже после фиксации, см. inetshop.outbox
+    """
+    kind = models.CharField(max_length=30, verbose_name='Тип уведомления')
+    payload = models.JSONField(verbose_name='Данные', default=dict)
+    # повторная запись того же события не создает второе письмо
+    dedupe_key = models.CharField(max_length=100, verbose_name='Ключ события', unique=True)
+    state = models.CharField(verbose_name='Статус', choices=OUTBOX_STATE_CHOICES, max_length=10, default='pending')
+    attempts = models.PositiveIntegerField(verbose_name='Попыток отправки', default=0)
+    available_at = models.DateTimeField(verbose_name='Отправить не раньше', default=timezone.now)
+    # пока срок не истек, уведомление отправляет другой relay
+    leased_until = models.DateTimeField(verbose_name='Захвачено до', null=True, blank=True)
+    last_error = models.TextField(verbose_name='Последняя ошибка', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Исходящее уведомление'
+        verbose_name_plural = "Очередь исходящих уведомлений"
+        ordering = ('id',)
+        indexes = [
+            # выборка очередной пачки к отправке
+            models.Index(fields=['state', 'available_at'], name='outbox_state_available'),
+            # скорость отправки за последние минуты, см. inetshop.outbox.outbox_metrics
+            models.Index(fields=['sent_at'], name='outbox_sent_at'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.dedupe_key} {self.state}'
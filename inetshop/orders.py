@@ -0,0 +1,148 @@
+"""
+Оформление и отмена заказов с резервированием остатков
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+from inetshop.basket import refresh_order_totals
+from inetshop.cache import bump_stock_version, bump_user_version
+from inetshop.documents import rebuild_offer_documents
+from inetshop.models import Order, OrderItem, ProductInfo
+from inetshop.outbox import enqueue_order_status
+
+# из этих статусов заказ можно отменить и вернуть товар на склад
+CANCELABLE_STATES = ('new', 'confirmed', 'assembled')
+
+# статусы, которые выставляет магазин: новый статус -> из какого статуса
+SHOP_TRANSITIONS = {
+    'confirmed': 'new',
+    'assembled': 'confirmed',
+    'sent': 'assembled',
+}
+# статусы позиций магазина по порядку: заказ в статусе самой отстающей позиции
+SHOP_STATES = ('new', 'confirmed', 'assembled', 'sent')
+
+
+class OrderError(Exception):
+    """
+    Заказ нельзя оформить или отменить
+    """
+
+
+class OutOfStock(OrderError):
+    def __init__(self, product_info_id):
+        self.product_info_id = product_info_id
+        super().__init__(f'Недостаточно товара на складе/Not enough stock: {product_info_id}')
+
+
+def place_order(user_id, order_id, contact_id):
+    """
+    Оформляет корзину как заказ и списывает остатки в одной транзакции.
+    Каждая позиция списывается условным UPDATE ... WHERE quantity >= n, поэтому остаток
+    не уходит в минус даже при одновременных заказах. Строки товаров блокируются в порядке id,
+    чтобы встречные заказы не взаимоблокировались. Если хоть одной позиции не хватает,
+    транзакция откатывается целиком. Уведомление покупателю записывается в outbox в той же транзакции
+    """
+    with transaction.atomic():
+        # смена статуса блокирует строку заказа: повторное оформление той же корзины ничего не найдет
+        if not Order.objects.filter(user_id=user_id, id=order_id, state='basket').update(
+                state='new', contact_id=contact_id):
+            raise OrderError('Корзина не найдена/Basket not found')
+
+        lines = list(OrderItem.objects.filter(order_id=order_id).order_by('product_info_id').values_list(
+            'product_info_id', 'quantity'))
+        for info_id, quantity in lines:
+            if not ProductInfo.objects.filter(id=info_id, is_active=True, quantity__gte=quantity).update(
+                    quantity=F('quantity') - quantity):
+                raise OutOfStock(info_id)
+
+        # цена фиксируется на момент оформления и не меняется при следующих загрузках прайса,
+        # магазин, статус и дата копируются в позиции для ленты заказов магазина
+        offers = ProductInfo.objects.filter(id=OuterRef('product_info_id'))
+        OrderItem.objects.filter(order_id=order_id).update(
+            price=Subquery(offers.values('price')),
+            shop_id=Subquery(offers.values('shop_id')),
+            order_state='new',
+            order_dt=Subquery(Order.objects.filter(id=OuterRef('order_id')).values('dt')))
+        refresh_order_totals(order_id)
+        enqueue_order_status([(order_id, user_id)], 'new')
+
+        _refresh_documents(info_id for info_id, _ in lines)
+
+
+def cancel_order(user_id, order_id):
+    """
+    Отменяет заказ и возвращает товар на склад. Статус заказа отстает от позиций магазинов,
+    поэтому заказ, в котором какой-то магазин уже отправил свои позиции, не отменяется
+    """
+    with transaction.atomic():
+        # блокировка заказа упорядочивает отмену с переводом позиций магазином
+        if not Order.objects.select_for_update().filter(
+                user_id=user_id, id=order_id, state__in=CANCELABLE_STATES).exists() or \
+                OrderItem.objects.filter(order_id=order_id).exclude(order_state__in=CANCELABLE_STATES).exists():
+            raise OrderError('Заказ нельзя отменить/Order cannot be canceled')
+        Order.objects.filter(id=order_id).update(state='canceled')
+        OrderItem.objects.filter(order_id=order_id).update(order_state='canceled')
+        enqueue_order_status([(order_id, user_id)], 'canceled')
+
+        lines = list(OrderItem.objects.filter(order_id=order_id).order_by('product_info_id').values_list(
+            'product_info_id', 'quantity'))
+        for info_id, quantity in lines:
+            ProductInfo.objects.filter(id=info_id).update(quantity=F('quantity') + quantity)
+
+        _refresh_documents(info_id for info_id, _ in lines)
+
+
+def transition_shop_orders(shop_id, order_ids, state):
+    """
+    Переводит позиции магазина в заказах в следующий статус одним UPDATE. Статус хранится
+    у позиций каждого магазина отдельно, а заказ получает статус самой отстающей позиции,
+    поэтому магазины могут переводить свои позиции в любом порядке. Покупатель получает
+    уведомление, когда меняется статус заказа. Заказы без позиций магазина в нужном статусе
+    пропускаются. Возвращает число заказов, у которых изменились позиции магазина
+    """
+    if state not in SHOP_TRANSITIONS:
+        raise OrderError(f'Недопустимый статус/Invalid state: {state}')
+
+    with transaction.atomic():
+        lines = OrderItem.objects.filter(order_id__in=order_ids, shop_id=shop_id, order_state=SHOP_TRANSITIONS[state])
+        # заказы блокируются в порядке id: параллельный перевод другим магазином и отмена ждут,
+        # а затем видят позиции этого магазина уже в новом статусе
+        orders = {order_id: (user_id, order_state) for order_id, user_id, order_state in
+                  Order.objects.select_for_update().filter(id__in=lines.values('order_id')).order_by('id').values_list(
+                      'id', 'user_id', 'state')}
+        if not orders:
+            return 0
+        lines.filter(order_id__in=orders).update(order_state=state)
+
+        least = {}
+        for order_id, line_state in OrderItem.objects.filter(order_id__in=orders).values_list('order_id', 'order_state'):
+            rank = SHOP_STATES.index(line_state) if line_state in SHOP_STATES else 0
+            least[order_id] = min(least.get(order_id, rank), rank)
+        moved = {}
+        for order_id, (user_id, order_state) in orders.items():
+            if order_state in SHOP_STATES and SHOP_STATES.index(order_state) < least[order_id]:
+                moved.setdefault(SHOP_STATES[least[order_id]], []).append((order_id, user_id))
+        for new_state, moved_orders in moved.items():
+            Order.objects.filter(id__in=[order_id for order_id, _ in moved_orders]).update(state=new_state)
+            enqueue_order_status(moved_orders, new_state)
+
+        # у покупателей меняется ETag истории заказов
+        for user_id in {user_id for user_id, _ in orders.values()}:
+            transaction.on_commit(partial(bump_user_version, user_id))
+    return len(orders)
+
+
+def _refresh_documents(info_ids):
+    # остаток в документах каталога обновляем после фиксации
+    transaction.on_commit(partial(_refresh_catalog, list(info_ids)))
+
+
+def _refresh_catalog(info_ids):
+    rebuild_offer_documents(info_ids)
+    # версия остатков входит в ETag и ключ кэша поиска предложений: без ее смены клиенты получали бы 304
+    # со старым остатком, а in_stock=true показывал бы распроданные предложения до следующей загрузки прайса
+    for shop_id in set(ProductInfo.objects.filter(id__in=info_ids).values_list('shop_id', flat=True)):
+        bump_stock_version(shop_id)
@@ -0,0 +1,213 @@
+"""
+Исходящие уведомления через таблицу OutboxMessage: событие пишется в той же транзакции,
+что и изменение заказа или токена, а письма отправляет relay_outbox уже после фиксации
+"""
+from datetime import timedelta
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from inetshop.models import ConfirmEmailToken, OutboxMessage, STATE_CHOICES, User
+
+# уведомлений в одной пачке, пачка отправляется через одно соединение
+OUTBOX_BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+# после стольких неудачных попыток уведомление больше не отправляется
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+# пауза после первой неудачи, секунд; каждая следующая вдвое длиннее, но не больше OUTBOX_MAX_RETRY_DELAY
+OUTBOX_RETRY_DELAY = getattr(settings, 'OUTBOX_RETRY_DELAY', 30)
+OUTBOX_MAX_RETRY_DELAY = getattr(settings, 'OUTBOX_MAX_RETRY_DELAY', 6 * 60 * 60)
+# окно сводки о статусах заказов, секунд: смены статусов, которые выставил магазин, копятся
+# и уходят покупателю одним письмом в конце окна. 0 - каждое событие отдельным письмом
+OUTBOX_DIGEST_WINDOW = getattr(settings, 'OUTBOX_DIGEST_WINDOW', 0)
+# пока пачка отправляется, другой relay ее не берет, секунд
+OUTBOX_LEASE = 5 * 60
+# за сколько последних секунд считается скорость отправки
+OUTBOX_METRICS_WINDOW = 5 * 60
+
+STATE_NAMES = dict(STATE_CHOICES)
+
+
+def enqueue(messages, delay=0):
+    """
+    Записывает уведомления (тип, ключ события, данные) одним INSERT.
+    Вызывается внутри транзакции, меняющей данные: при откате уведомление тоже пропадает.
+    Событие с уже записанным ключом пропускается
+    """
+    available_at = timezone.now() + timedelta(seconds=delay)
+    OutboxMessage.objects.bulk_create(
+        [OutboxMessage(kind=kind, dedupe_key=dedupe_key, payload=payload, available_at=available_at)
+         for kind, dedupe_key, payload in messages],
+        ignore_conflicts=True)
+
+
+def enqueue_order_status(orders, state):
+    """
+    Уведомления о смене статуса для пар (id заказа, id покупателя).
+    Об оформлении заказа письмо уходит сразу, остальные статусы в режиме сводки ждут конца окна
+    """
+    enqueue((('order_status', f'order:{order_id}:{state}', {'user_id': user_id, 'order_id': order_id, 'state': state})
+             for order_id, user_id in orders), delay=0 if state == 'new' else OUTBOX_DIGEST_WINDOW)
+
+
+def request_email_confirmation(user):
+    """
+    Создает токен подтверждения почты и письмо с ним в одной транзакции
+    """
+    with transaction.atomic():
+        token = ConfirmEmailToken.objects.create(user=user)
+        enqueue([('confirm_email', f'confirm:{token.id}', {'user_id': user.id, 'key': token.key})])
+    return token
+
+
+def build_email(messages, emails):
+    """
+    Письмо для уведомления или сводки о статусах заказов одного покупателя;
+    emails - адреса покупателей пачки по id
+    """
+    message = messages[0]
+    email = emails.get(message.payload['user_id'])
+    if email is None:
+        raise ValueError('Пользователь удален/User was deleted')
+
+    if len(messages) > 1:
+        # сводка: по каждому заказу последний статус
+        states = {}
+        for event in messages:
+            states[event.payload['order_id']] = STATE_NAMES.get(event.payload['state'], event.payload['state'])
+        body = '\n'.join(f'Заказ №{order_id}: {state}' for order_id, state in states.items())
+        return EmailMultiAlternatives("Обновление статуса заказов", body, settings.EMAIL_HOST_USER, [email])
+
+    if message.kind == 'confirm_email':
+        subject, body = f"Password Reset Token for {email}", f"Привет твой токен{message.payload['key']}"
+    elif message.kind == 'order_status' and message.payload['state'] == 'new':
+        subject, body = "Обновление статуса заказа", 'Заказ сформирован'
+    elif message.kind == 'order_status':
+        state = STATE_NAMES.get(message.payload['state'], message.payload['state'])
+        subject, body = "Обновление статуса заказа", f"Заказ №{message.payload['order_id']}: {state}"
+    else:
+        raise ValueError(f'Неизвестный тип уведомления/Unknown kind: {message.kind}')
+    return EmailMultiAlternatives(subject, body, settings.EMAIL_HOST_USER, [email])
+
+
+def relay_outbox(batch_size=OUTBOX_BATCH_SIZE, kinds=None):
+    """
+    Отправляет очередную пачку уведомлений через одно соединение с почтовым сервером.
+    kinds ограничивает типы уведомлений: срочные письма отправляет отдельный relay в своей очереди,
+    и поток смен статусов заказов их не задерживает.
+    Пачка выбирается с SKIP LOCKED и захватывается на OUTBOX_LEASE (leased_until), поэтому
+    параллельные relay не отправляют одно письмо дважды. В режиме сводки к пачке добавляются все ожидающие смены
+    статусов тех же покупателей, и каждый покупатель получает одно письмо.
+    Неудачные уведомления откладываются с экспоненциальной паузой, после OUTBOX_MAX_ATTEMPTS
+    попыток или при неисправимой ошибке переходят в статус dead.
+    Возвращает число отправленных, отложенных и недоставленных уведомлений и отправленных писем
+    """
+    batch = _claim_batch(batch_size, kinds)
+    statistics = {'sent': 0, 'retried': 0, 'dead': 0, 'emails': 0}
+    if not batch:
+        return statistics
+
+    emails = dict(User.objects.filter(id__in={message.payload.get('user_id') for message in batch}).values_list(
+        'id', 'email'))
+    # письмо -> его уведомления
+    groups = []
+    digests = {}
+    for message in batch:
+        if OUTBOX_DIGEST_WINDOW and message.kind == 'order_status':
+            if message.payload['user_id'] not in digests:
+                digests[message.payload['user_id']] = []
+                groups.append(digests[message.payload['user_id']])
+            digests[message.payload['user_id']].append(message)
+        else:
+            groups.append([message])
+
+    errors = {}
+    try:
+        with get_connection() as connection:
+            for group in groups:
+                try:
+                    connection.send_messages([build_email(group, emails)])
+                except (SMTPException, OSError, KeyError, ValueError) as error:
+                    errors.update((message.id, error) for message in group)
+                else:
+                    errors.update((message.id, None) for message in group)
+                    statistics['emails'] += 1
+    except (SMTPException, OSError) as error:
+        # почтовый сервер недоступен: откладываем все, что не успели отправить
+        for message in batch:
+            errors.setdefault(message.id, error)
+
+    now = timezone.now()
+    sent = [message_id for message_id, error in errors.items() if error is None]
+    OutboxMessage.objects.filter(id__in=sent).update(state='sent', sent_at=now, attempts=F('attempts') + 1,
+                                                     last_error='', leased_until=None)
+    statistics['sent'] = len(sent)
+    for message in batch:
+        error = errors[message.id]
+        if error is None:
+            continue
+        message.attempts += 1
+        message.last_error = str(error)
+        if message.attempts >= OUTBOX_MAX_ATTEMPTS or isinstance(error, (KeyError, ValueError)):
+            message.state = 'dead'
+            statistics['dead'] += 1
+        else:
+            delay = min(OUTBOX_RETRY_DELAY * 2 ** (message.attempts - 1), OUTBOX_MAX_RETRY_DELAY)
+            message.available_at = now + timedelta(seconds=delay)
+            statistics['retried'] += 1
+        message.leased_until = None
+        message.save(update_fields=['attempts', 'last_error', 'state', 'available_at', 'leased_until'])
+    return statistics
+
+
+def _claim_batch(batch_size, kinds=None):
+    now = timezone.now()
+    # захваченные другим relay пропускаем, пока не истек срок захвата: после сбоя relay они снова уходят
+    free = OutboxMessage.objects.select_for_update(skip_locked=True).filter(
+        Q(leased_until__isnull=True) | Q(leased_until__lte=now), state='pending')
+    if kinds is not None:
+        free = free.filter(kind__in=kinds)
+    with transaction.atomic():
+        batch = list(free.filter(available_at__lte=now).order_by('id')[:batch_size])
+        if OUTBOX_DIGEST_WINDOW:
+            # окно сводки закрылось у первого события покупателя, его остальные события уходят вместе с ним
+            users = {message.payload['user_id'] for message in batch if message.kind == 'order_status'}
+            if users:
+                batch += free.filter(kind='order_status', available_at__gt=now,
+                                     payload__user_id__in=users).order_by('id')
+        OutboxMessage.objects.filter(id__in=[message.id for message in batch]).update(
+            leased_until=now + timedelta(seconds=OUTBOX_LEASE))
+    return batch
+
+
+def outbox_metrics():
+    """
+    Состояние очереди уведомлений одним запросом: сколько ждет отправки и сколько из этого
+    уже пора отправить, возраст самого старого ожидающего уведомления в секундах,
+    сколько недоставлено и скорость отправки в уведомлениях в минуту
+    """
+    now = timezone.now()
+    since = now - timedelta(seconds=OUTBOX_METRICS_WINDOW)
+    metrics = OutboxMessage.objects.aggregate(
+        pending=Count('id', filter=Q(state='pending')),
+        due=Count('id', filter=Q(Q(leased_until__isnull=True) | Q(leased_until__lte=now), state='pending',
+                                 available_at__lte=now)),
+        dead=Count('id', filter=Q(state='dead')),
+        sent_recently=Count('id', filter=Q(state='sent', sent_at__gte=since)),
+        oldest_pending=Min('created_at', filter=Q(state='pending')))
+    oldest_pending = metrics.pop('oldest_pending')
+    metrics['lag'] = (now - oldest_pending).total_seconds() if oldest_pending else 0
+    metrics['throughput'] = metrics.pop('sent_recently') * 60 / OUTBOX_METRICS_WINDOW
+    metrics['digest_window'] = OUTBOX_DIGEST_WINDOW
+    return metrics
+
+
+def requeue_dead(queryset):
+    """
+    Возвращает недоставленные уведомления в очередь с обнуленным счетчиком попыток
+    """
+    return queryset.filter(state='dead').update(state='pending', attempts=0, available_at=timezone.now(),
+                                                leased_until=None)
@@ -0,0 +1,46 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CatalogCursorPagination(CursorPagination):
+    """
+    Постраничный вывод каталога по курсору.
+    Следующая страница выбирается условием id > последнего id по индексу, без OFFSET,
+    поэтому дальние страницы стоят столько же, сколько первая
+    """
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class OfferCursorPagination(CatalogCursorPagination):
+    """
+    Постраничный вывод документов предложений, курсор по id предложения
+    """
+    ordering = 'product_info_id'
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Постраничный вывод результатов поиска: они отсортированы по релевантности, а не по id,
+    поэтому страница выбирается по номеру
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class OrderCursorPagination(CatalogCursorPagination):
+    """
+    История заказов по курсору, новые заказы первыми
+    """
+    ordering = ('-dt', '-id')
+    page_size = 20
+
+
+class ShopOrderCursorPagination(CatalogCursorPagination):
+    """
+    Лента заказов магазина по курсору, по индексу позиций (магазин, статус, дата)
+    """
+    ordering = ('-order_dt', '-order_id')
+    page_size = 20
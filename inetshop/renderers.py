@@ -0,0 +1,17 @@
+import ujson
+from rest_framework.renderers import JSONRenderer
+
+
+class UJSONRenderer(JSONRenderer):
+    """
+    Рендер JSON через ujson для горячих списков, данные которых уже собраны в простые словари
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        try:
+            return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+        except (TypeError, OverflowError):
+            # типы, которые ujson не знает (Decimal, даты, ленивые строки), рендерим стандартно
+            return super().render(data, accepted_media_type, renderer_context)
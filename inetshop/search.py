@@ -0,0 +1,105 @@
+"""
+Полнотекстовый поиск по предложениям каталога.
+Текст для поиска (название товара, модель и значения параметров) хранится в CatalogOffer.search_text
+и записывается вместе с документом предложения при загрузке прайса, а индекс по нему обновляет сама база:
+в PostgreSQL это GIN по to_tsvector и триграммный GIN для неточных совпадений,
+в SQLite - таблица FTS5, которую заполняют триггеры
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+from inetshop.models import CatalogOffer
+
+SEARCH_CONFIG = 'russian'
+
+FTS_TABLE = 'inetshop_catalogoffer_fts'
+
+SEARCH_WORD = re.compile(r'\w+')
+
+POSTGRESQL_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f"CREATE INDEX IF NOT EXISTS inetshop_catalogoffer_search_idx ON inetshop_catalogoffer "
+    f"USING gin (to_tsvector('{SEARCH_CONFIG}'::regconfig, COALESCE(search_text, '')))",
+    'CREATE INDEX IF NOT EXISTS inetshop_catalogoffer_search_trgm_idx ON inetshop_catalogoffer '
+    'USING gin (search_text gin_trgm_ops)',
+)
+
+SQLITE_INDEXES = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"search_text, content='inetshop_catalogoffer', content_rowid='product_info_id', "
+    f"tokenize='unicode61 remove_diacritics 2')",
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON inetshop_catalogoffer BEGIN '
+    f'INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.product_info_id, new.search_text); END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON inetshop_catalogoffer BEGIN '
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) "
+    f"VALUES ('delete', old.product_info_id, old.search_text); END",
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF search_text ON inetshop_catalogoffer BEGIN '
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) "
+    f"VALUES ('delete', old.product_info_id, old.search_text); "
+    f'INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.product_info_id, new.search_text); END',
+)
+
+
+def build_search_text(document):
+    """
+    Текст для поиска по документу предложения
+    """
+    return ' '.join([document['product']['name'], document['model'],
+                     *(parameter['value'] for parameter in document['product_parameters'])])
+
+
+def install_search_index(using='default', **kwargs):
+    """
+    Создает поисковый индекс, если его еще нет. Вызывается после migrate
+    """
+    connection = connections[using]
+    tables = connection.introspection.table_names()
+    if CatalogOffer._meta.db_table not in tables:
+        return
+    statements = {'postgresql': POSTGRESQL_INDEXES, 'sqlite': SQLITE_INDEXES}.get(connection.vendor, ())
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+        if connection.vendor == 'sqlite' and FTS_TABLE not in tables:
+            # уже загруженные документы попадают в новый индекс один раз, дальше его ведут триггеры
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def search_offers(queryset, text):
+    """
+    Оставляет в выборке предложений найденные по тексту и сортирует их по релевантности (поле rank)
+    """
+    words = SEARCH_WORD.findall(text.lower())
+    if not words:
+        return queryset.none()
+    if connections[queryset.db].vendor == 'postgresql':
+        return _search_postgresql(queryset, ' '.join(words))
+    return _search_sqlite(queryset, words)
+
+
+def _search_postgresql(queryset, text):
+    vector = SearchVector('search_text', config=SEARCH_CONFIG)
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='plain')
+    found = queryset.annotate(search=vector).filter(search=query)
+    if found.exists():
+        return found.annotate(rank=SearchRank(vector, query)).order_by('-rank', 'product_info_id')
+
+    # опечатки и части слов: сходство по триграммам
+    return queryset.filter(search_text__trigram_word_similar=text).annotate(
+        rank=TrigramWordSimilarity(text, 'search_text')).order_by('-rank', 'product_info_id')
+
+
+def _search_sqlite(queryset, words):
+    # каждое слово ищется как префикс, слова объединяются по И
+    match = ' '.join('"%s"*' % word for word in words)
+    table = CatalogOffer._meta.db_table
+    return queryset.filter(
+        product_info_id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    ).annotate(
+        # bm25 тем меньше, чем точнее совпадение
+        rank=RawSQL(f'SELECT -rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                    f'AND rowid = {table}.product_info_id', [match])
+    ).order_by('-rank', 'product_info_id')
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
-from inetshop.models import Category, Shop, ProductInfo, Product, ProductParameter, OrderItem, Order, Contact, User
+from inetshop.models import Category, Shop, ProductInfo, Product, ProductParameter, OrderItem, Order, Contact, User, \
+    ImportJob
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -65,8 +66,8 @@ class ProductInfoSerializer(serializers.ModelSerializer):
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
-        fields = ('id', 'product_info', 'quantity', 'order',)
-        read_only_fields = ('id',)
+        fields = ('id', 'product_info', 'quantity', 'price', 'order',)
+        read_only_fields = ('id', 'price',)
         extra_kwargs = {
             'order': {'write_only': True}
         }
@@ -79,10 +80,19 @@ class OrderItemCreateSerializer(OrderItemSerializer):
 class OrderSerializer(serializers.ModelSerializer):
     ordered_items = OrderItemCreateSerializer(read_only=True, many=True)
 
-    total_sum = serializers.IntegerField()
     contact = ContactSerializer(read_only=True)
 
     class Meta:
         model = Order
-        fields = ('id', 'ordered_items', 'state', 'dt', 'total_sum', 'contact',)
-        read_only_fields = ('id',)
+        fields = ('id', 'ordered_items', 'state', 'dt', 'total_sum', 'items_count', 'contact',)
+        read_only_fields = ('id', 'total_sum', 'items_count',)
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    processed = serializers.IntegerField(source='current_processed', read_only=True)
+    duration = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'state', 'processed', 'total', 'errors', 'duration', 'statistics',)
+        read_only_fields = fields
@@ -1,14 +1,57 @@
+import os
+
 import celery
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
 from django_rest_passwordreset.signals import reset_password_token_created
 
-from inetshop.models import ConfirmEmailToken, User
+from inetshop.feeds import count_goods, download_price_list, read_price_list
+from inetshop.importer import PriceListImporter
+from inetshop.models import ImportJob, Shop
+from inetshop.outbox import relay_outbox as relay_outbox_batch
+
+app = celery.Celery('tasks')
+# настройки CELERY_* из settings.py: брокер, очереди и маршруты задач, CELERY_TASK_ALWAYS_EAGER для тестов
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+
+def worker_argv(queue):
+    """
+    Аргументы воркера, который обслуживает одну очередь с ее лимитами из CELERY_QUEUE_LIMITS
+    """
+    limits = settings.CELERY_QUEUE_LIMITS[queue]
+    return ['worker', '--queues', queue, '--hostname', f'{queue}@%h',
+            '--concurrency', str(limits['concurrency']),
+            '--prefetch-multiplier', str(limits['prefetch_multiplier'])]
+
+
+def send_mail_batch(messages):
+    """
+    Отправляет пачку писем через одно соединение с почтовым сервером
+    вместо отдельного SSL-соединения на каждое письмо
+    """
+    with get_connection() as connection:
+        return connection.send_messages(messages)
+
+
+@app.task()
+def send_notifications(notifications):
+    """
+    Отправляем пачку уведомлений, каждое в виде (тема, текст, адрес), через одно соединение
+    """
+    return send_mail_batch([EmailMultiAlternatives(subject, body, settings.EMAIL_HOST_USER, [email])
+                            for subject, body, email in notifications])
+
 
-app = celery.Celery('tasks', broker='redis://127.0.0.1:6379/1',
-                    backend='redis://127.0.0.1:6379/2'
-                    )
+@app.task()
+def relay_outbox(kinds=None, **kwargs):
+    """
+    Отправляем очередную пачку уведомлений из outbox, запускается по расписанию celery beat
+    отдельно для каждой очереди писем со своими типами уведомлений
+    """
+    return relay_outbox_batch(kinds=kinds)
 
 
 @app.task()
@@ -34,47 +77,65 @@ def password_reset_token_created(sender, instance, reset_password_token, **kwarg
         # to:
         [reset_password_token.user.email]
     )
-    msg.send()
+    send_mail_batch([msg])
 
 
-@app.task()
-def new_user_registered(user_id, **kwargs):
+# подтверждение после выполнения: воркер с prefetch 1 не держит следующий прайс, пока грузит текущий
+@app.task(acks_late=True)
+def import_price_list(job_id, **kwargs):
     """
-    Отправляем письмо с подтверждением почты
+    Загружаем прайс-лист поставщика в фоне, ход выполнения пишем в ImportJob.
+    Прайс по ссылке скачивается условным запросом и не загружается повторно, если не изменился
     """
-    # send an e-mail to the user
-    token, _ = ConfirmEmailToken.objects.get_or_create(user_id=user_id)
+    job = ImportJob.objects.select_related('shop').get(id=job_id)
+    job.state = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['state', 'started_at'])
 
-    msg = EmailMultiAlternatives(
-        # title:
-        f"Password Reset Token for {token.user.email}",
-        # message:
-        f"Привет твой токен{token.key}",
-        # from:
-        settings.EMAIL_HOST_USER,
-        # to:
-        [token.user.email]
-    )
-    msg.send()
-    print(token.key)
+    download = None
+    try:
+        path = job.source
+        if job.is_remote:
+            # валидаторы берем только у магазина задачи и только для его же ссылки
+            shop = job.shop if job.shop and job.shop.url == job.source else None
+            download = download_price_list(job.source,
+                                           etag=shop.feed_etag if shop else '',
+                                           last_modified=shop.feed_last_modified if shop else '',
+                                           timeout=settings.PARTNER_FEED_TIMEOUT)
+            if download is None or (shop and shop.feed_hash == download.content_hash):
+                job.state = 'skipped'
+                if download is not None:
+                    Shop.objects.filter(id=shop.id).update(feed_etag=download.etag,
+                                                           feed_last_modified=download.last_modified)
+            else:
+                path = download.path
 
+        if job.state != 'skipped':
+            with open(path, 'rb') as fh:
+                job.total = count_goods(fh)
+            job.save(update_fields=['total'])
 
-@app.task()
-def new_order(user_id, **kwargs):
-    """
-    Отправляем письмо при изменении статуса заказа
-    """
-    # send an e-mail to the user
-    user = User.objects.get(id=user_id)
+            with open(path, 'rb') as fh:
+                statistics = PriceListImporter(progress=job.report_progress, shop_id=job.shop_id,
+                                               user_id=job.user_id).run_stream(read_price_list(fh))
 
-    msg = EmailMultiAlternatives(
-        # title:
-        f"Обновление статуса заказа",
-        # message:
-        'Заказ сформирован',
-        # from:
-        settings.EMAIL_HOST_USER,
-        # to:
-        [user.email]
-    )
-    msg.send()
+            job.state = 'done'
+            job.statistics = statistics
+            job.processed = statistics['rows']
+            if download is not None:
+                Shop.objects.filter(id=statistics['shop_id']).update(url=job.source,
+                                                                     feed_etag=download.etag,
+                                                                     feed_last_modified=download.last_modified,
+                                                                     feed_hash=download.content_hash)
+    except Exception as error:
+        # любая ошибка завершает задачу: прайс неверной структуры (price: null, parameters: null)
+        # падает с TypeError или AttributeError, и задача не должна навсегда остаться в статусе running
+        job.state = 'failed'
+        job.errors = [f'{type(error).__name__}: {error}']
+    finally:
+        if download is not None:
+            os.remove(download.path)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['state', 'errors', 'statistics', 'processed', 'finished_at'])
+    return job.state
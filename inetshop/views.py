@@ -1,30 +1,45 @@
+from datetime import datetime, time
 from distutils.util import strtobool
 from django.core.exceptions import ValidationError
 from django.core.mail import EmailMultiAlternatives
 from django.core.validators import URLValidator
+from kombu.exceptions import OperationalError
 from requests import get
 from ujson import loads as load_json
 from yaml import load as load_yaml, Loader
-from backendshop import settings
+from django.conf import settings
 
 import yaml
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 
-from django.db import IntegrityError
-from django.db.models import Q, Sum, F
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 from rest_framework.authtoken.models import Token
 from rest_framework.generics import ListAPIView
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from inetshop.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, \
-    Contact, ConfirmEmailToken, User
-from inetshop.tasks import new_order, new_user_registered
+    Contact, ConfirmEmailToken, User, ImportJob, CatalogOffer
+from inetshop.basket import add_basket_items, refresh_order_totals, update_basket_items
+from inetshop.cache import CatalogCacheMixin, bump_user_version, user_etag
+from inetshop.documents import build_order_documents, build_order_summaries, build_shop_order_documents
+from inetshop.facets import facet_counts, filter_offers, parse_facet_filters
+from inetshop.orders import OrderError, cancel_order, place_order, transition_shop_orders
+from inetshop.outbox import outbox_metrics, request_email_confirmation
+from inetshop.pagination import CatalogCursorPagination, OfferCursorPagination, OrderCursorPagination, \
+    SearchPagination, ShopOrderCursorPagination
+from inetshop.renderers import UJSONRenderer
+from inetshop.search import search_offers
+from inetshop.tasks import import_price_list
 from inetshop.serializers import CategorySerializer, ShopSerializer, ProductInfoSerializer, ContactSerializer, \
-    UserSerializer, ProductSerializer, OrderSerializer, OrderItemSerializer
+    UserSerializer, ProductSerializer, OrderSerializer, OrderItemSerializer, ImportJobSerializer
 
 
 class RegisterAccount(APIView):
@@ -50,10 +65,12 @@ class RegisterAccount(APIView):
             user_serializer = UserSerializer(data=request.data)
             if user_serializer.is_valid():
                 # сохраняем пользователя
-                user = user_serializer.save()
-                user.set_password(request.data['password'])
-                user.save()
-                new_user_registered(user.id)
+                with transaction.atomic():
+                    user = user_serializer.save()
+                    user.set_password(request.data['password'])
+                    user.save()
+                    # письмо отправит relay_outbox, запрос не ждет ни брокер, ни почтовый сервер
+                    request_email_confirmation(user)
                 return JsonResponse({'Status': True})
             else:
                 return JsonResponse({'Status': False, 'Errors': user_serializer.errors})
@@ -106,6 +123,11 @@ class AccountDetails(APIView):
     def post(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+        # request.user собран из снимка в кэше и может быть устаревшим: сохраняем свежую запись из базы,
+        # иначе старые is_active и is_staff записались бы обратно
+        user = User.objects.filter(id=request.user.id, is_active=True).first()
+        if user is None:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
         # проверяем обязательные аргументы
 
         if 'password' in request.data:
@@ -120,10 +142,10 @@ class AccountDetails(APIView):
                     error_array.append(item)
                 return JsonResponse({'Status': False, 'Errors': {'password': error_array}})
             else:
-                request.user.set_password(request.data['password'])
+                user.set_password(request.data['password'])
 
         # проверяем остальные данные
-        user_serializer = UserSerializer(request.user, data=request.data, partial=True)
+        user_serializer = UserSerializer(user, data=request.data, partial=True)
         if user_serializer.is_valid():
             user_serializer.save()
             return JsonResponse({'Status': True})
@@ -155,41 +177,63 @@ class LoginAccount(APIView):
                              'Errors': 'Не указаны все необходимые аргументы/All necessary arguments are not specified'})
 
 
-class ProductsView(ListAPIView):
+class ProductsView(CatalogCacheMixin, ListAPIView):
     """
     Класс для просмотра товаров
     """
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('category')
     serializer_class = ProductSerializer
+    pagination_class = CatalogCursorPagination
+    renderer_classes = (UJSONRenderer, BrowsableAPIRenderer)
+
+    def list(self, request, *args, **kwargs):
+        # простые словари из values() вместо обхода полей ProductSerializer
+        queryset = self.filter_queryset(self.get_queryset()).values('id', 'name', 'category__name')
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response([{'name': row['name'], 'category': row['category__name']}
+                                            for row in page])
 
 
-class CategoryView(ListAPIView):
+class CategoryView(CatalogCacheMixin, ListAPIView):
     """
     Класс для просмотра категорий
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    pagination_class = CatalogCursorPagination
 
 
-class ShopView(ListAPIView):
+class ShopView(CatalogCacheMixin, ListAPIView):
     """
     Класс для просмотра списка магазинов
     """
     queryset = Shop.objects.filter(state=True)
     serializer_class = ShopSerializer
+    pagination_class = CatalogCursorPagination
 
 
-class ProductInfoView(APIView):
+class ProductInfoView(CatalogCacheMixin, APIView):
     """
     Класс для поиска товаров
     """
-    def get(self, request, product_id=0, *args, **kwargs):
+    renderer_classes = (UJSONRenderer, BrowsableAPIRenderer)
+    with_stock = True
 
+    # допустимые значения ordering: порядок выдачи с id предложения для однозначности курсора
+    orderings = {
+        'price': ('price', 'product_info_id'),
+        '-price': ('-price', '-product_info_id'),
+        'quantity': ('quantity', 'product_info_id'),
+    }
+
+    def list(self, request, product_id=0, *args, **kwargs):
+
+        # документы предложений берем из денормализованной таблицы, без вложенных сериализаторов
         if product_id != 0:
-            queryset = ProductInfo.objects.filter(product_id=product_id)
-            serializer = ProductInfoSerializer(queryset, many=True)
-            return Response(serializer.data)
-        query = Q(shop__state=True)
+            documents = CatalogOffer.objects.filter(
+                product_id=product_id, is_active=True).order_by('product_info_id').values_list('document', flat=True)
+            return Response(list(documents))
+        query = Q(shop__state=True, is_active=True)
         shop_id = request.query_params.get('shop_id')
         category_id = request.query_params.get('category_id')
 
@@ -197,16 +241,72 @@ class ProductInfoView(APIView):
             query = query & Q(shop_id=shop_id)
 
         if category_id:
-            query = query & Q(product__category_id=category_id)
-
-        # фильтруем и отбрасываем дубликаты
-        queryset = ProductInfo.objects.filter(
-            query).select_related(
-            'shop', 'product__category').prefetch_related(
-            'product_parameters__parameter').distinct()
-        serializer = ProductInfoSerializer(queryset, many=True)
+            query = query & Q(category_id=category_id)
+
+        ordering = request.query_params.get('ordering')
+        if ordering and ordering not in self.orderings:
+            return JsonResponse({'Status': False, 'Errors': f'Недопустимая сортировка/Invalid ordering: {ordering}'},
+                                status=400)
+        # фильтры по цене и наличию индекс параметров не знает, счетчики тогда считаются по выборке
+        value_filters = Q()
+        try:
+            min_price = request.query_params.get('min_price')
+            if min_price:
+                value_filters &= Q(price__gte=int(min_price))
+            max_price = request.query_params.get('max_price')
+            if max_price:
+                value_filters &= Q(price__lte=int(max_price))
+            if strtobool(request.query_params.get('in_stock', 'false')):
+                value_filters &= Q(quantity__gt=0)
+            query &= value_filters
+        except ValueError:
+            return JsonResponse({'Status': False, 'Errors': 'Неверное значение фильтра/Invalid filter value'},
+                                status=400)
+
+        queryset = CatalogOffer.objects.filter(query)
+        text = request.query_params.get('q')
+
+        # фильтры по параметрам и счетчики значений считаются по обратному индексу
+        filters = request.query_params.getlist('param')
+        with_facets = request.query_params.get('facets')
+        offer_ids = None
+        if filters or with_facets:
+            try:
+                selected = parse_facet_filters(filters)
+                shop_ids = Shop.objects.filter(state=True)
+                if shop_id:
+                    shop_ids = shop_ids.filter(id=int(shop_id))
+                shop_ids = list(shop_ids.values_list('id', flat=True))
+                offer_ids = filter_offers(shop_ids, selected, int(category_id) if category_id else None)
+            except ValueError as error:
+                return JsonResponse({'Status': False, 'Errors': str(error)}, status=400)
+            if filters:
+                queryset = queryset.filter(product_info_id__in=sorted(offer_ids))
+            if value_filters:
+                # счетчики по текущей выборке: пересекаем с предложениями, прошедшими фильтры по цене
+                offer_ids = offer_ids & set(queryset.values_list('product_info_id', flat=True))
+
+        if text:
+            # найденные предложения отдаем по релевантности, если не задана другая сортировка
+            queryset = search_offers(queryset, text)
+            if ordering:
+                queryset = queryset.order_by(*self.orderings[ordering])
+            queryset = queryset.values('product_info_id', 'document')
+            paginator = SearchPagination()
+        else:
+            # фильтруем и отдаем страницу по курсору, поля сортировки нужны для позиции курсора
+            queryset = queryset.values('product_info_id', 'price', 'quantity', 'document')
+            paginator = OfferCursorPagination()
+            if ordering:
+                paginator.ordering = self.orderings[ordering]
+        page = paginator.paginate_queryset(queryset, request, view=self)
 
-        return Response(serializer.data)
+        response = paginator.get_paginated_response([row['document'] for row in page])
+        if with_facets:
+            if text:
+                offer_ids = set(queryset.values_list('product_info_id', flat=True))
+            response.data['facets'] = facet_counts(shop_ids, offer_ids)
+        return response
 
 
 class BasketView(APIView):
@@ -216,14 +316,14 @@ class BasketView(APIView):
 
     # получить корзину
 
+    @user_etag
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
         basket = Order.objects.filter(
-            id=request.user.id, state='basket').prefetch_related(
+            user_id=request.user.id, state='basket').prefetch_related(
             'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
+            'ordered_items__product_info__product_parameters__parameter')
 
         serializer = OrderSerializer(basket, many=True)
         return Response(serializer.data)
@@ -236,28 +336,13 @@ class BasketView(APIView):
 
         items_dict = request.data.get('items')
         if items_dict:
-            #     try:
-            #         items_dict = load_json(items_sting)
-            #     except ValueError:
-            #         return JsonResponse({'Status': False, 'Errors': 'Неверный формат запроса'})
-            #     else:
             basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
-            objects_created = 0
-            for order_item in items_dict:
-                order_item.update({'order': basket.id})
-                serializer = OrderItemSerializer(data=order_item)
-                if serializer.is_valid():
-                    try:
-                        serializer.save()
-                    except IntegrityError as error:
-                        return JsonResponse({'Status': False, 'Errors': str(error)})
-                    else:
-                        objects_created += 1
-
-                else:
-
-                    return JsonResponse({'Status': False, 'Errors': serializer.errors})
+            # все позиции проверяются и записываются пачкой, уже лежащие в корзине суммируются
+            objects_created, errors = add_basket_items(basket, items_dict)
+            if errors:
+                return JsonResponse({'Status': False, 'Errors': errors})
 
+            bump_user_version(request.user.id)
             return JsonResponse({'Status': True, 'Создано объектов/Objects created': objects_created})
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы All necessary arguments '
                                                         'are not specified'})
@@ -270,19 +355,13 @@ class BasketView(APIView):
 
         items_dict = request.data.get('items')
         if items_dict:
-            # try:
-            #     items_dict = load_json(items_sting)
-            # except ValueError:
-            #     return JsonResponse({'Status': False, 'Errors': 'Неверный формат запроса Invalid request format'})
-            # else:
             basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
-            objects_updated = 0
-            for order_item in items_dict:
-                if type(order_item['quantity']) == int and type(order_item['id']) == int:
-                    objects_updated += OrderItem.objects.filter(order_id=basket.id, id=order_item['id']).update(
-                        quantity=order_item['quantity'])
+            # все позиции проверяются по остаткам и обновляются одним запросом
+            objects_updated, results = update_basket_items(basket, items_dict)
 
-            return JsonResponse({'Status': True, 'Обновлено объектов Updated objects': objects_updated})
+            bump_user_version(request.user.id)
+            return JsonResponse({'Status': True, 'Обновлено объектов Updated objects': objects_updated,
+                                 'Items': results})
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы/All necessary arguments '
                                                         'are not specified'})
 
@@ -305,6 +384,8 @@ class BasketView(APIView):
 
             if objects_deleted:
                 deleted_count = OrderItem.objects.filter(query).delete()[0]
+                refresh_order_totals(basket.id)
+                bump_user_version(request.user.id)
                 return JsonResponse({'Status': True, 'Удалено объектов': deleted_count})
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
@@ -314,53 +395,194 @@ class PartnerUpdate(APIView):
     Класс для обновления прайса от поставщика
     """
     def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+        if request.user.type != 'shop':
+            return JsonResponse({'Status': False, 'Error': 'Только для магазинов/Shops only'}, status=403)
+
+        # прайс берем по ссылке из запроса, затем по сохраненной ссылке магазина, иначе локальный файл
+        source = request.data.get('url')
+        shop = Shop.objects.filter(user_id=request.user.id).first()
+        if source:
+            max_length = ImportJob._meta.get_field('source').max_length
+            try:
+                URLValidator(schemes=['http', 'https'])(source)
+                if len(source) > max_length:
+                    raise ValidationError(f'Ссылка длиннее {max_length} символов/URL is longer than {max_length}')
+            except ValidationError as error:
+                return JsonResponse({'Status': False, 'Errors': error.messages})
+        elif shop and shop.url:
+            source = shop.url
+        else:
+            source = str(settings.PARTNER_PRICE_LIST)
+
+        # импорт выполняется в фоне, клиент сразу получает номер задачи.
+        # Загружается только прайс магазина этого партнера, см. PriceListImporter.lock_shop
+        job = ImportJob.objects.create(source=source, user=request.user, shop=shop)
+        try:
+            import_price_list.delay(job.id)
+        except OperationalError as error:
+            # брокер недоступен: задача не поставлена, иначе она навсегда осталась бы в очереди
+            job.state = 'failed'
+            job.errors = [f'{type(error).__name__}: {error}']
+            job.finished_at = timezone.now()
+            job.save(update_fields=['state', 'errors', 'finished_at'])
+            return JsonResponse({'Status': False, 'Errors': 'Очередь задач недоступна/Task queue is unavailable',
+                                 'Job': job.id}, status=503)
+
+        return JsonResponse({'Status': True, 'Job': job.id})
+
+
+class PartnerUpdateStatus(APIView):
+    """
+    Класс для получения статуса загрузки прайса
+    """
+    def get(self, request, job_id, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+
+        # ошибки и статистика загрузки содержат ссылки и пути, поэтому видны только автору
+        job = ImportJob.objects.filter(id=job_id, user_id=request.user.id).first()
+        if job is None:
+            return JsonResponse({'Status': False, 'Errors': 'Задача не найдена/Job not found'}, status=404)
+
+        return JsonResponse({'Status': True, 'Job': ImportJobSerializer(job).data})
+
+
+class OutboxMetricsView(APIView):
+    """
+    Класс для получения состояния очереди писем: отставание и скорость отправки
+    """
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_authenticated or not request.user.is_staff:
+            return JsonResponse({'Status': False, 'Error': 'Только для администраторов/Staff only'}, status=403)
+
+        return JsonResponse({'Status': True, 'Metrics': outbox_metrics()})
+
+
+def parse_moment(value, end_of_day=False):
+    """
+    Дата или дата и время из параметра запроса. Для даты без времени берется начало или конец дня
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Неверная дата/Invalid date: {value}')
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class PartnerOrders(APIView):
+    """
+    Класс для получения заказов с товарами магазина и смены их статуса
+    """
+    renderer_classes = (UJSONRenderer, BrowsableAPIRenderer)
+
+    def partner_shop(self, request):
+        if not request.user.is_authenticated:
+            return None, JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+        if request.user.type != 'shop':
+            return None, JsonResponse({'Status': False, 'Error': 'Только для магазинов/Shops only'}, status=403)
+        shop = Shop.objects.filter(user_id=request.user.id).first()
+        if shop is None:
+            return None, JsonResponse({'Status': False, 'Errors': 'Магазин не найден/Shop not found'}, status=404)
+        return shop, None
+
+    # получить заказы магазина
+
+    def get(self, request, *args, **kwargs):
+        shop, error = self.partner_shop(request)
+        if error:
+            return error
+
+        # заказы выбираются по позициям магазина, по индексу (магазин, статус, дата)
+        items = OrderItem.objects.filter(shop_id=shop.id).exclude(order_state='basket')
+        try:
+            state = request.query_params.get('state')
+            if state:
+                items = items.filter(order_state=state)
+            date_from = request.query_params.get('date_from')
+            if date_from:
+                items = items.filter(order_dt__gte=parse_moment(date_from))
+            date_to = request.query_params.get('date_to')
+            if date_to:
+                items = items.filter(order_dt__lte=parse_moment(date_to, end_of_day=True))
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Errors': str(error)}, status=400)
+
+        paginator = ShopOrderCursorPagination()
+        page = paginator.paginate_queryset(items.values('order_id', 'order_dt').distinct(), request, view=self)
+        return paginator.get_paginated_response(build_shop_order_documents(shop.id, [row['order_id'] for row in page]))
+
+    # перевести заказы в следующий статус
+
+    def post(self, request, *args, **kwargs):
+        shop, error = self.partner_shop(request)
+        if error:
+            return error
 
-        with open('file.yaml') as fh:
+        order_ids = request.data.get('ids')
+        state = request.data.get('state')
+        if not isinstance(order_ids, list) or not all(type(order_id) is int for order_id in order_ids) or not state:
+            return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
+        try:
+            updated = transition_shop_orders(shop.id, order_ids, state)
+        except OrderError as error:
+            return JsonResponse({'Status': False, 'Errors': str(error)})
+        return JsonResponse({'Status': True, 'Обновлено объектов Updated objects': updated})
 
-            data = yaml.load(fh, Loader=yaml.FullLoader)
 
-        shop, _ = Shop.objects.get_or_create(name=data['shop'])
-        for category in data['categories']:
-            category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-            category_object.shops.add(shop.id)
-            category_object.save()
-        ProductInfo.objects.filter(shop_id=shop.id).delete()
-        for item in data['goods']:
-            product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
+class OrderDetailView(APIView):
+    """
+    Класс для получения одного заказа с позициями
+    """
+    renderer_classes = (UJSONRenderer, BrowsableAPIRenderer)
 
-            product_info = ProductInfo.objects.create(product_id=product.id,
-                                                      external_id=item['id'],
-                                                      model=item['model'],
-                                                      price=item['price'],
-                                                      price_rrc=item['price_rrc'],
-                                                      quantity=item['quantity'],
-                                                      shop_id=shop.id)
-            for name, value in item['parameters'].items():
-                parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                ProductParameter.objects.create(product_info_id=product_info.id,
-                                                parameter_id=parameter_object.id,
-                                                value=value)
+    @user_etag
+    def get(self, request, order_id, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
 
-        return JsonResponse({'Status': True})
+        documents = build_order_documents(Order.objects.filter(user_id=request.user.id, id=order_id).exclude(
+            state='basket'))
+        if not documents:
+            return JsonResponse({'Status': False, 'Errors': 'Заказ не найден/Order not found'}, status=404)
+        return Response(documents[0])
 
 
 class OrderView(APIView):
     """
     Класс для получения и размешения заказов пользователями
     """
+    renderer_classes = (UJSONRenderer, BrowsableAPIRenderer)
+
     # получить мои заказы
 
+    @user_etag
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
-        order = Order.objects.filter(
-            id=request.user.id).exclude(state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        try:
+            summary = strtobool(request.query_params.get('summary', 'false'))
+        except ValueError:
+            return JsonResponse({'Status': False, 'Errors': 'Неверное значение фильтра/Invalid filter value'},
+                                status=400)
+
+        orders = Order.objects.filter(user_id=request.user.id).exclude(state='basket')
+        state = request.query_params.get('state')
+        if state:
+            orders = orders.filter(state=state)
+
+        # страница заказов по курсору, по индексу (пользователь, статус, дата)
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(orders.values('id', 'dt'), request, view=self)
+        page_orders = Order.objects.filter(id__in=[row['id'] for row in page]).order_by('-dt', '-id')
+
+        # в кратком виде позиции заказов не загружаются
+        if summary:
+            return paginator.get_paginated_response(build_order_summaries(page_orders))
+        return paginator.get_paginated_response(build_order_documents(page_orders))
 
     # разместить заказ из корзины
 
@@ -377,17 +599,33 @@ class OrderView(APIView):
                                                        )
             if request.data['id'].isdigit():
                 try:
-                    is_updated = Order.objects.filter(
-                        user_id=request.user.id, id=request.data['id']).update(
-                        contact_id=contact.id,
-                        state='new')
+                    # товар резервируется на складе вместе со сменой статуса
+                    place_order(request.user.id, int(request.data['id']), contact.id)
+                except OrderError as error:
+                    return JsonResponse({'Status': False, 'Errors': str(error)})
                 except IntegrityError as error:
                     print(error)
                     return JsonResponse({'Status': False, 'Errors': 'Неправильно указаны аргументы'})
                 else:
-                    if is_updated:
-                        new_order(user_id=request.user.id)
-                        return JsonResponse({'Status': True})
+                    bump_user_version(request.user.id)
+                    return JsonResponse({'Status': True})
 
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы и контактов_'
                                                         'All necessary arguments and contacts are not specified'})
+
+    # отменить заказ
+
+    def delete(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+
+        order_id = str(request.data.get('id', ''))
+        if order_id.isdigit():
+            try:
+                # товар возвращается на склад
+                cancel_order(request.user.id, int(order_id))
+            except OrderError as error:
+                return JsonResponse({'Status': False, 'Errors': str(error)})
+            bump_user_version(request.user.id)
+            return JsonResponse({'Status': True})
+        return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
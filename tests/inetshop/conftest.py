@@ -0,0 +1,80 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+import yaml
+from django.core.cache import caches
+
+from inetshop.tasks import app
+
+FEED_PATH = Path(__file__).resolve().parents[2] / 'file.yaml'
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """
+    Кэш в памяти процесса переживает откат базы между тестами
+    """
+    for cache in caches.all():
+        cache.clear()
+
+
+@pytest.fixture
+def price_list():
+    with open(FEED_PATH) as fh:
+        return yaml.load(fh, Loader=yaml.FullLoader)
+
+
+@pytest.fixture
+def celery_eager():
+    """
+    Задачи Celery выполняются сразу в процессе теста, без брокера и Redis
+    """
+    # брокер из settings.py задан с префиксом CELERY_, он перекрывает ключи без префикса
+    previous = {key: app.conf[key] for key in ('task_always_eager', 'task_eager_propagates', 'CELERY_BROKER_URL',
+                                               'CELERY_RESULT_BACKEND')}
+    app.conf.update(task_always_eager=True, task_eager_propagates=True, CELERY_BROKER_URL='memory://',
+                    CELERY_RESULT_BACKEND='cache+memory://')
+    yield app
+    app.conf.update(previous)
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """
+    Отдает прайс-лист с ETag и учитывает условные запросы
+    """
+    etag = '"v1"'
+    use_validators = True
+    requests = []
+
+    def do_GET(self):
+        FeedHandler.requests.append(dict(self.headers))
+        if self.use_validators and self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = FEED_PATH.read_bytes()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-yaml')
+        self.send_header('Content-Length', str(len(body)))
+        if self.use_validators:
+            self.send_header('ETag', self.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def feed_url():
+    FeedHandler.requests = []
+    FeedHandler.use_validators = True
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/price.yaml'
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,90 @@
+import pytest
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from inetshop.authentication import CachedTokenAuthentication
+from inetshop.models import User
+
+
+@pytest.fixture
+def buyer():
+    user = User.objects.create(email='buyer@example.com', username='buyer', first_name='Иван', is_active=True)
+    user.set_password('Old-pass-1234')
+    user.save()
+    return user
+
+
+@pytest.fixture
+def client(buyer):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=buyer).key}')
+    return client
+
+
+@pytest.mark.django_db
+def test_cache_hit_costs_no_queries(buyer, django_assert_num_queries):
+    token = Token.objects.create(user=buyer)
+    request = Request(APIRequestFactory().get('/basket', HTTP_AUTHORIZATION=f'Token {token.key}'))
+    CachedTokenAuthentication().authenticate(request)
+
+    with django_assert_num_queries(0):
+        user, auth = CachedTokenAuthentication().authenticate(request)
+
+    assert (user.id, user.email, user.type, auth.key) == (buyer.id, buyer.email, buyer.type, token.key)
+
+
+@pytest.mark.django_db
+def test_details_from_snapshot(client, django_assert_max_num_queries):
+    client.get('/basket')
+
+    # остается только запрос контактов пользователя
+    with django_assert_max_num_queries(1):
+        response = client.get('/user/details')
+    assert response.status_code == 200
+    assert response.json()['first_name'] == 'Иван'
+
+
+@pytest.mark.django_db
+def test_password_change_keeps_password_and_invalidates(client, buyer):
+    client.get('/user/details')
+
+    assert client.post('/user/details', {'password': 'New-pass-5678', 'company': 'ООО'}).json()['Status'] is True
+
+    buyer.refresh_from_db()
+    assert buyer.check_password('New-pass-5678')
+    assert buyer.company == 'ООО'
+    # следующий запрос видит новые данные, а не снимок из кэша
+    assert client.get('/user/details').json()['company'] == 'ООО'
+
+
+@pytest.mark.django_db
+def test_deactivated_user_is_rejected(client, buyer):
+    assert client.get('/user/details').status_code == 200
+
+    buyer.is_active = False
+    buyer.save()
+
+    assert client.get('/user/details').status_code == 401
+
+
+@pytest.mark.django_db
+def test_deleted_token_is_rejected(client, buyer):
+    assert client.get('/user/details').status_code == 200
+
+    Token.objects.filter(user=buyer).get().delete()
+
+    assert client.get('/user/details').status_code == 401
+
+
+@pytest.mark.django_db
+def test_stale_snapshot_does_not_reactivate_user(client, buyer):
+    client.get('/user/details')
+    # деактивация в другом процессе: снимок в кэше этого процесса не сброшен
+    User.objects.filter(id=buyer.id).update(is_active=False)
+
+    response = client.post('/user/details', {'company': 'ООО'})
+
+    assert response.status_code == 403
+    buyer.refresh_from_db()
+    assert (buyer.is_active, buyer.company) == (False, '')
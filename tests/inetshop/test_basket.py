@@ -0,0 +1,171 @@
+import pytest
+from rest_framework.test import APIClient
+
+from inetshop.importer import PriceListImporter
+from inetshop.models import Order, OrderItem, ProductInfo, User
+from tests.inetshop.test_importer import make_price_list
+
+
+@pytest.fixture
+def buyer():
+    return User.objects.create(email='buyer@example.com', username='buyer', is_active=True)
+
+
+@pytest.fixture
+def client(buyer):
+    client = APIClient()
+    client.force_authenticate(buyer)
+    return client
+
+
+@pytest.fixture
+def offers():
+    PriceListImporter().run(make_price_list(150))
+    # у каждого предложения на складе хотя бы 10 штук
+    ProductInfo.objects.update(quantity=10)
+    return list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+
+
+def add(client, items):
+    return client.post('/basket', {'items': items}, format='json').json()
+
+
+def basket_lines(buyer):
+    return dict(OrderItem.objects.filter(order__user=buyer, order__state='basket').values_list(
+        'product_info_id', 'quantity'))
+
+
+@pytest.mark.django_db
+def test_add_items(client, buyer, offers):
+    response = add(client, [{'product_info': offers[0], 'quantity': 2}, {'product_info': offers[1], 'quantity': 1}])
+
+    assert response['Status'] is True
+    assert basket_lines(buyer) == {offers[0]: 2, offers[1]: 1}
+
+
+@pytest.mark.django_db
+def test_existing_lines_are_summed(client, buyer, offers):
+    add(client, [{'product_info': offers[0], 'quantity': 2}])
+
+    response = add(client, [{'product_info': offers[0], 'quantity': 3}, {'product_info': offers[0], 'quantity': 1}])
+
+    assert response['Status'] is True
+    assert basket_lines(buyer) == {offers[0]: 6}
+    assert Order.objects.filter(user=buyer, state='basket').count() == 1
+
+
+@pytest.mark.django_db
+def test_stock_is_checked_with_basket(client, buyer, offers):
+    add(client, [{'product_info': offers[0], 'quantity': 8}])
+
+    response = add(client, [{'product_info': offers[0], 'quantity': 3}, {'product_info': offers[1], 'quantity': 1}])
+
+    assert response['Status'] is False
+    assert list(response['Errors']) == [str(offers[0])]
+    assert basket_lines(buyer) == {offers[0]: 8}
+
+
+@pytest.mark.django_db
+def test_unavailable_and_invalid_items(client, buyer, offers):
+    ProductInfo.objects.filter(id=offers[1]).update(is_active=False)
+
+    response = add(client, [{'product_info': offers[1], 'quantity': 1}, {'product_info': 10 ** 9, 'quantity': 1}])
+    assert set(response['Errors']) == {str(offers[1]), str(10 ** 9)}
+
+    response = add(client, [{'product_info': offers[0], 'quantity': 0}, {'product_info': 'x', 'quantity': 1}])
+    assert set(response['Errors']) == {'0', '1'}
+    assert basket_lines(buyer) == {}
+
+
+@pytest.mark.django_db
+def test_query_count_does_not_depend_on_lines(client, buyer, offers, django_assert_max_num_queries):
+    add(client, [{'product_info': offers[0], 'quantity': 1}])
+
+    with django_assert_max_num_queries(6):
+        response = add(client, [{'product_info': info_id, 'quantity': 1} for info_id in offers[:100]])
+
+    assert response['Status'] is True
+    assert len(basket_lines(buyer)) == 100
+    assert basket_lines(buyer)[offers[0]] == 2
+
+
+def update(client, items):
+    return client.put('/basket', {'items': items}, format='json').json()
+
+
+def line_ids(buyer):
+    return dict(OrderItem.objects.filter(order__user=buyer, order__state='basket').values_list(
+        'product_info_id', 'id'))
+
+
+@pytest.mark.django_db
+def test_update_quantities(client, buyer, offers):
+    add(client, [{'product_info': info_id, 'quantity': 1} for info_id in offers[:3]])
+    lines = line_ids(buyer)
+
+    response = update(client, [{'id': lines[offers[0]], 'quantity': 5}, {'id': lines[offers[1]], 'quantity': 11},
+                               {'id': lines[offers[2]], 'quantity': 'x'}])
+
+    assert response['Status'] is True
+    assert response['Обновлено объектов Updated objects'] == 1
+    assert {item.get('id', item.get('item')): item['Status'] for item in response['Items']} == {
+        lines[offers[0]]: True, lines[offers[1]]: False, '2': False}
+    assert basket_lines(buyer) == {offers[0]: 5, offers[1]: 1, offers[2]: 1}
+
+
+@pytest.mark.django_db
+def test_update_is_scoped_to_basket(client, buyer, offers):
+    other = User.objects.create(email='other@example.com', username='other', is_active=True)
+    foreign = OrderItem.objects.create(order=Order.objects.create(user=other, state='basket'),
+                                       product_info_id=offers[0], quantity=1)
+
+    response = update(client, [{'id': foreign.id, 'quantity': 3}])
+
+    assert response['Items'][0]['Status'] is False
+    foreign.refresh_from_db()
+    assert foreign.quantity == 1
+
+
+@pytest.mark.django_db
+def test_update_query_count_does_not_depend_on_lines(client, buyer, offers, django_assert_max_num_queries):
+    add(client, [{'product_info': info_id, 'quantity': 1} for info_id in offers[:100]])
+    lines = line_ids(buyer)
+
+    with django_assert_max_num_queries(4):
+        response = update(client, [{'id': line_id, 'quantity': 2} for line_id in lines.values()])
+
+    assert response['Обновлено объектов Updated objects'] == 100
+    assert set(basket_lines(buyer).values()) == {2}
+
+
+@pytest.mark.django_db
+def test_basket_totals_follow_changes(client, buyer, offers):
+    prices = dict(ProductInfo.objects.values_list('id', 'price'))
+    add(client, [{'product_info': offers[0], 'quantity': 2}, {'product_info': offers[1], 'quantity': 1}])
+    basket = Order.objects.get(user=buyer, state='basket')
+    assert (basket.total_sum, basket.items_count) == (2 * prices[offers[0]] + prices[offers[1]], 3)
+
+    update(client, [{'id': line_ids(buyer)[offers[0]], 'quantity': 4}])
+    basket.refresh_from_db()
+    assert (basket.total_sum, basket.items_count) == (4 * prices[offers[0]] + prices[offers[1]], 5)
+
+    client.delete('/basket', {'items': str(line_ids(buyer)[offers[0]])}, format='json')
+    basket.refresh_from_db()
+    assert (basket.total_sum, basket.items_count) == (prices[offers[1]], 1)
+
+
+@pytest.mark.django_db
+def test_basket_totals_follow_price_import(client, buyer, offers):
+    add(client, [{'product_info': offers[0], 'quantity': 2}, {'product_info': offers[1], 'quantity': 1}])
+    placed = Order.objects.create(user=buyer, state='new', total_sum=500, items_count=1)
+    OrderItem.objects.create(order=placed, product_info_id=offers[0], quantity=1, price=500)
+    price_list = make_price_list(150)
+    price_list['goods'][0]['price'] = 1000
+
+    PriceListImporter().run(price_list)
+
+    basket = Order.objects.get(user=buyer, state='basket')
+    assert (basket.total_sum, basket.items_count) == (2 * 1000 + ProductInfo.objects.get(id=offers[1]).price, 3)
+    placed.refresh_from_db()
+    # у оформленного заказа цены зафиксированы
+    assert placed.total_sum == 500
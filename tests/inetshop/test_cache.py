@@ -0,0 +1,58 @@
+import pytest
+from rest_framework.test import APIClient
+
+from inetshop.cache import catalog_version, bump_catalog_version
+from inetshop.importer import PriceListImporter
+from inetshop.models import Shop
+from tests.inetshop.test_importer import make_price_list
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.mark.django_db
+def test_catalog_reads_are_served_from_cache(client, django_assert_num_queries):
+    PriceListImporter().run(make_price_list(5))
+    first = client.get('/product').json()
+
+    with django_assert_num_queries(0):
+        second = client.get('/product').json()
+
+    assert first == second
+    assert len(second['results']) == 5
+
+
+@pytest.mark.django_db
+def test_import_invalidates_cache(client, django_capture_on_commit_callbacks):
+    client.get('/shops')
+    with django_capture_on_commit_callbacks(execute=True):
+        PriceListImporter().run(make_price_list(5))
+
+    response = client.get('/shops').json()
+
+    assert [shop['name'] for shop in response['results']] == ['Большой магазин']
+
+
+@pytest.mark.django_db
+def test_unchanged_import_keeps_version(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        PriceListImporter().run(make_price_list(5))
+    shop_id = Shop.objects.get().id
+    versions = catalog_version(), catalog_version(shop_id)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        PriceListImporter().run(make_price_list(5))
+
+    assert (catalog_version(), catalog_version(shop_id)) == versions
+
+
+def test_shop_version_is_independent():
+    other_shop = catalog_version(2)
+    global_version = catalog_version()
+
+    bump_catalog_version(1)
+
+    assert catalog_version(2) == other_shop
+    assert catalog_version() == global_version + 1
@@ -0,0 +1,72 @@
+import pytest
+from celery.contrib.testing.worker import start_worker
+from django.core import mail
+from django.core.management import call_command
+
+from inetshop.tasks import app, import_price_list, password_reset_token_created, relay_outbox, send_notifications, \
+    worker_argv
+
+
+@pytest.fixture
+def memory_broker(settings):
+    """
+    Профиль CELERY_PROFILE=memory: брокер и результаты в памяти процесса, задачи идут через очереди
+    """
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+    # настройки из settings.py читаются с префиксом CELERY_ и перекрывают ключи без префикса
+    previous = {key: app.conf[key] for key in ('task_always_eager', 'CELERY_BROKER_URL', 'CELERY_RESULT_BACKEND')}
+    app.conf.update(task_always_eager=False, CELERY_BROKER_URL='memory://', CELERY_RESULT_BACKEND='cache+memory://')
+    yield app
+    app.conf.update(previous)
+
+
+def queue_of(task):
+    return app.amqp.router.route({}, task.name)['queue'].name
+
+
+def test_tasks_are_routed_by_name():
+    assert {task.name: queue_of(task) for task in (
+        password_reset_token_created, relay_outbox, send_notifications, import_price_list)} == {
+        'inetshop.tasks.password_reset_token_created': 'mail_critical',
+        'inetshop.tasks.relay_outbox': 'mail_critical',
+        'inetshop.tasks.send_notifications': 'mail_bulk',
+        'inetshop.tasks.import_price_list': 'imports',
+    }
+
+
+def test_outbox_relays_are_split_by_queue(settings):
+    assert {name: (entry['kwargs']['kinds'], app.amqp.router.route(entry['options'], entry['task'])['queue'].name)
+            for name, entry in settings.CELERY_BEAT_SCHEDULE.items()} == {
+        'relay-outbox-critical': (['confirm_email'], 'mail_critical'),
+        'relay-outbox-bulk': (['order_status'], 'mail_bulk'),
+    }
+
+
+def test_beat_command_runs_outbox_schedule(mocker):
+    start = mocker.patch.object(app, 'start')
+
+    call_command('celery_beat')
+
+    start.assert_called_once_with(['beat'])
+    assert set(app.conf.beat_schedule) == {'relay-outbox-critical', 'relay-outbox-bulk'}
+
+
+def test_worker_argv_uses_queue_limits(settings):
+    settings.CELERY_QUEUE_LIMITS = {'imports': {'concurrency': 1, 'prefetch_multiplier': 1}}
+
+    assert worker_argv('imports') == ['worker', '--queues', 'imports', '--hostname', 'imports@%h',
+                                      '--concurrency', '1', '--prefetch-multiplier', '1']
+
+
+def test_imports_do_not_block_mail(memory_broker):
+    # задача загрузки ждет в своей очереди, ее никто не обслуживает
+    import_price_list.delay(10 ** 9)
+
+    with start_worker(app, pool='solo', queues=['mail_bulk'], perform_ping_check=False):
+        results = [send_notifications.delay([('Тема', 'Текст', f'user{number}@example.com')])
+                   for number in range(20)]
+        assert [result.get(timeout=10) for result in results] == [1] * 20
+
+    assert len(mail.outbox) == 20
+    with app.connection_for_write() as connection:
+        assert connection.SimpleQueue('imports').qsize() == 1
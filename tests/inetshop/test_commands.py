@@ -0,0 +1,64 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+from inetshop.models import ImportJob, ProductInfo, Shop, User
+
+
+@pytest.mark.django_db
+def test_import_price_lists_report(feed_url):
+    Shop.objects.create(name='Маркет', url=feed_url)
+    Shop.objects.create(name='Без прайса')
+    out = StringIO()
+
+    call_command('import_price_lists', workers=1, stdout=out)
+
+    assert ProductInfo.objects.count() == 4
+    assert ImportJob.objects.get().state == 'done'
+    report = out.getvalue()
+    assert 'Маркет' in report and 'done' in report
+    assert 'Без прайса' not in report
+    assert 'Магазинов: 1' in report
+
+
+@pytest.mark.django_db
+def test_unchanged_feed_is_skipped(feed_url):
+    Shop.objects.create(name='Маркет', url=feed_url)
+    call_command('import_price_lists', workers=1, stdout=StringIO())
+
+    call_command('import_price_lists', workers=1, stdout=StringIO())
+
+    assert list(ImportJob.objects.order_by('id').values_list('state', flat=True)) == ['done', 'skipped']
+
+
+@pytest.mark.django_db
+def test_feed_of_another_shop_is_rejected(feed_url):
+    owner = User.objects.create(email='owner@example.com', username='owner', type='shop', is_active=True)
+    attacker = User.objects.create(email='attacker@example.com', username='attacker', type='shop', is_active=True)
+    market = Shop.objects.create(name='Маркет', user=owner)
+    # прайс по ссылке называет чужой магазин
+    Shop.objects.create(name='Attacker', user=attacker, url=feed_url)
+
+    call_command('import_price_lists', workers=1, stdout=StringIO(), stderr=StringIO())
+
+    job = ImportJob.objects.get()
+    assert job.state == 'failed'
+    assert 'другого магазина' in job.errors[0]
+    assert not ProductInfo.objects.exists()
+    market.refresh_from_db()
+    assert not market.url
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_price_lists_in_process_pool(feed_url):
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        pytest.skip('дочерние процессы не видят базу SQLite в памяти')
+    Shop.objects.create(name='Маркет', url=feed_url)
+    out = StringIO()
+
+    call_command('import_price_lists', workers=2, stdout=out)
+
+    assert ProductInfo.objects.count() == 4
+    assert 'процессов: 2' in out.getvalue()
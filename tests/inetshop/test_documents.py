@@ -0,0 +1,46 @@
+import pytest
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from inetshop.documents import build_offer_documents
+from inetshop.importer import PriceListImporter
+from inetshop.models import CatalogOffer, ProductInfo
+from inetshop.serializers import ProductInfoSerializer
+from tests.inetshop.test_importer import make_price_list
+
+
+@pytest.mark.django_db
+def test_documents_match_serializer(price_list):
+    PriceListImporter().run(price_list)
+
+    for info in ProductInfo.objects.all():
+        assert CatalogOffer.objects.get(product_info=info).document == ProductInfoSerializer(info).data
+
+
+@pytest.mark.django_db
+def test_only_touched_offers_are_rebuilt(price_list):
+    PriceListImporter().run(price_list)
+    CatalogOffer.objects.update(document={})
+    price_list['goods'][0]['quantity'] = 0
+    removed = price_list['goods'].pop()
+
+    PriceListImporter().run(price_list)
+
+    changed = CatalogOffer.objects.get(product_info__external_id=price_list['goods'][0]['id'])
+    assert changed.document['quantity'] == 0
+    assert not CatalogOffer.objects.get(product_info__external_id=removed['id']).is_active
+    assert CatalogOffer.objects.filter(document={}).count() == 2
+
+
+@pytest.mark.django_db
+def test_product_info_view_serves_documents(django_assert_max_num_queries):
+    PriceListImporter().run(make_price_list(20))
+    ProductInfo.objects.filter(external_id__lt=5).update(is_active=False)
+    call_command('rebuild_catalog_documents', stdout=None)
+
+    with django_assert_max_num_queries(1):
+        response = APIClient().get('/product', {'category_id': 1}).json()
+
+    expected = build_offer_documents(ProductInfo.objects.filter(
+        is_active=True, product__category_id=1).values_list('id', flat=True))
+    assert response['results'] == [document for _, document in sorted(expected.values(), key=lambda row: row[1]['id'])]
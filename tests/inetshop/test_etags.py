@@ -0,0 +1,88 @@
+import pytest
+from rest_framework.test import APIClient
+
+from inetshop.cache import bump_catalog_version
+from inetshop.importer import PriceListImporter
+from inetshop.models import ProductInfo, User
+from tests.inetshop.test_importer import make_price_list
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def buyer_client():
+    user = User.objects.create(email='buyer@example.com', username='buyer', is_active=True)
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', ['/products', '/categories', '/shops', '/product'])
+def test_catalog_not_modified_without_queries(client, url, django_assert_num_queries):
+    PriceListImporter().run(make_price_list(5))
+    etag = client.get(url)['ETag']
+
+    with django_assert_num_queries(0):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 304
+    assert response['ETag'] == etag
+
+
+@pytest.mark.django_db
+def test_catalog_etag_changes_with_version(client):
+    PriceListImporter().run(make_price_list(5))
+    etag = client.get('/products')['ETag']
+
+    bump_catalog_version()
+    response = client.get('/products', HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+
+@pytest.mark.django_db
+def test_product_detail_etag(client):
+    PriceListImporter().run(make_price_list(5))
+    url = f'/product/{ProductInfo.objects.first().product_id}'
+    etag = client.get(url)['ETag']
+
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', ['/basket', '/order'])
+def test_user_not_modified_without_queries(buyer_client, url, django_assert_num_queries):
+    etag = buyer_client.get(url)['ETag']
+
+    with django_assert_num_queries(0):
+        response = buyer_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db
+def test_basket_write_changes_etag(buyer_client):
+    PriceListImporter().run(make_price_list(5))
+    etag = buyer_client.get('/basket')['ETag']
+    info = ProductInfo.objects.filter(quantity__gt=0).first()
+
+    buyer_client.post('/basket', {'items': [{'product_info': info.id, 'quantity': 1}]}, format='json')
+    response = buyer_client.get('/basket', HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+
+@pytest.mark.django_db
+def test_etag_is_per_user(buyer_client):
+    etag = buyer_client.get('/order')['ETag']
+    other = User.objects.create(email='other@example.com', username='other', is_active=True)
+    client = APIClient()
+    client.force_authenticate(other)
+
+    assert client.get('/order', HTTP_IF_NONE_MATCH=etag).status_code == 200
@@ -0,0 +1,88 @@
+import pytest
+from rest_framework.test import APIClient
+
+from inetshop import facets
+from inetshop.facets import facet_counts, filter_offers, parse_facet_filters
+from inetshop.importer import PriceListImporter
+from inetshop.models import ProductInfo, Shop
+
+
+def offers(**params):
+    return APIClient().get('/product', params).json()
+
+
+def external_ids(response):
+    ids = [document['id'] for document in response['results']]
+    return sorted(ProductInfo.objects.filter(id__in=ids).values_list('external_id', flat=True))
+
+
+@pytest.fixture
+def catalog(price_list, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        PriceListImporter().run(price_list)
+    return Shop.objects.get()
+
+
+@pytest.mark.django_db
+def test_filter_by_parameters(catalog):
+    assert external_ids(offers(param='Цвет=красный')) == [4216314]
+    assert external_ids(offers(param=['Встроенная память (Гб)=256', 'Диагональ (дюйм)=6.1'])) == [
+        4216227, 4216314, 4672671]
+    # значения одного параметра объединяются по ИЛИ
+    assert external_ids(offers(param=['Цвет=красный', 'Цвет=синий'])) == [4216314, 4672671]
+    assert external_ids(offers(param=['Цвет=красный', 'Диагональ (дюйм)=6.5'])) == []
+
+
+@pytest.mark.django_db
+def test_facet_counts_for_result_set(catalog):
+    response = offers(param='Диагональ (дюйм)=6.1', facets=1)
+
+    assert response['facets']['Цвет'] == {'красный': 1, 'черный': 1, 'синий': 1}
+    assert response['facets']['Встроенная память (Гб)'] == {'256': 3}
+    assert offers(facets=1)['facets']['Диагональ (дюйм)'] == {'6.5': 1, '6.1': 3}
+
+
+@pytest.mark.django_db
+def test_facets_with_search(catalog):
+    response = offers(q='черный', facets=1)
+
+    assert external_ids(response) == [4216227]
+    assert response['facets']['Цвет'] == {'черный': 1}
+
+
+@pytest.mark.django_db
+def test_facets_follow_import(catalog, price_list, django_capture_on_commit_callbacks):
+    price_list['goods'][1]['parameters']['Цвет'] = 'белый'
+    price_list['goods'].pop()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        PriceListImporter().run(price_list)
+
+    assert filter_offers([catalog.id], parse_facet_filters(['Цвет=красный'])) == set()
+    assert len(filter_offers([catalog.id], parse_facet_filters(['Цвет=белый']))) == 1
+    assert filter_offers([catalog.id], parse_facet_filters(['Цвет=синий'])) == set()
+
+
+@pytest.mark.django_db
+def test_facets_are_served_without_queries(catalog, django_assert_num_queries):
+    offer_ids = filter_offers([catalog.id], {})
+
+    with django_assert_num_queries(0):
+        counts = facet_counts([catalog.id], offer_ids)
+
+    assert counts['Цвет']['золотистый'] == 1
+
+
+@pytest.mark.django_db
+def test_facets_are_rebuilt_from_cache(catalog):
+    facets._loaded.clear()
+
+    assert len(filter_offers([catalog.id], parse_facet_filters(['Встроенная память (Гб)=256']))) == 3
+
+
+@pytest.mark.django_db
+def test_invalid_filter(catalog):
+    response = APIClient().get('/product', {'param': 'Цвет'})
+
+    assert response.status_code == 400
+    assert response.json()['Status'] is False
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from inetshop.basket import refresh_order_totals
+from inetshop.documents import build_order_documents
+from inetshop.importer import PriceListImporter
+from inetshop.models import Contact, Order, OrderItem, Product, ProductInfo, User
+from inetshop.renderers import UJSONRenderer
+from inetshop.serializers import OrderSerializer, ProductSerializer
+from tests.inetshop.test_importer import make_price_list
+
+
+@pytest.fixture
+def orders():
+    PriceListImporter().run(make_price_list(10))
+    user = User.objects.create(email='buyer@example.com', username='buyer')
+    contact = Contact.objects.create(user=user, city='Москва', street='Тверская', phone='123')
+    infos = list(ProductInfo.objects.order_by('id'))
+    for number, state in enumerate(('new', 'sent', 'basket')):
+        order = Order.objects.create(user=user, state=state, contact=contact if state != 'basket' else None)
+        OrderItem.objects.bulk_create([OrderItem(order=order, product_info=info, quantity=number + 1,
+                                                 price=info.price if state != 'basket' else None)
+                                       for info in infos[number:number + 3]])
+        refresh_order_totals(order.id)
+    Order.objects.create(user=user, state='new')
+    return Order.objects.filter(user=user)
+
+
+@pytest.mark.django_db
+def test_order_documents_match_serializer(orders):
+    expected = OrderSerializer(orders, many=True).data
+
+    documents = sorted(build_order_documents(orders), key=lambda order: order['id'])
+    assert documents == sorted(json.loads(JSONRenderer().render(expected)), key=lambda order: order['id'])
+
+
+@pytest.mark.django_db
+def test_order_documents_query_count(orders, django_assert_num_queries):
+    with django_assert_num_queries(5):
+        build_order_documents(orders)
+
+
+@pytest.mark.django_db
+def test_products_view_matches_serializer():
+    PriceListImporter().run(make_price_list(5))
+
+    response = APIClient().get('/products')
+
+    assert response['Content-Type'] == 'application/json'
+    assert response.json()['results'] == ProductSerializer(Product.objects.order_by('id'), many=True).data
+
+
+def test_ujson_renderer():
+    data = {'name': 'Смартфон', 'model': 'apple/iphone'}
+
+    assert json.loads(UJSONRenderer().render(data)) == data
+    assert UJSONRenderer().render(data) == '{"name":"Смартфон","model":"apple/iphone"}'.encode()
@@ -0,0 +1,104 @@
+import pytest
+from requests import ConnectionError
+from rest_framework.test import APIClient
+
+from inetshop.feeds import download_price_list
+from inetshop.models import ImportJob, ProductInfo, Shop, User
+from tests.inetshop.conftest import FeedHandler
+
+
+@pytest.fixture
+def partner():
+    return User.objects.create(email='shop@example.com', username='shop', type='shop', is_active=True)
+
+
+def pull(url, user):
+    client = APIClient()
+    client.force_authenticate(user)
+    job_id = client.post('/partner/update', {'url': url}, format='json').json()['Job']
+    return ImportJob.objects.get(id=job_id)
+
+
+@pytest.mark.django_db
+def test_feed_is_imported_and_validators_are_stored(partner, feed_url, celery_eager):
+    job = pull(feed_url, partner)
+
+    assert job.state == 'done'
+    assert ProductInfo.objects.count() == 4
+    shop = Shop.objects.get(name='Маркет')
+    assert (shop.url, shop.feed_etag, shop.user) == (feed_url, '"v1"', partner)
+    assert len(shop.feed_hash) == 64
+
+
+@pytest.mark.django_db
+def test_not_modified_feed_is_skipped(partner, feed_url, celery_eager, django_assert_max_num_queries):
+    pull(feed_url, partner)
+
+    with django_assert_max_num_queries(6):
+        job = pull(feed_url, partner)
+
+    assert job.state == 'skipped'
+    assert FeedHandler.requests[-1]['If-None-Match'] == '"v1"'
+
+
+@pytest.mark.django_db
+def test_same_content_is_skipped_by_hash(partner, feed_url, celery_eager):
+    FeedHandler.use_validators = False
+    pull(feed_url, partner)
+    ProductInfo.objects.update(price=1)
+
+    job = pull(feed_url, partner)
+
+    assert job.state == 'skipped'
+    assert not ProductInfo.objects.exclude(price=1).exists()
+
+
+@pytest.mark.django_db
+def test_invalid_url_is_rejected(partner):
+    client = APIClient()
+    client.force_authenticate(partner)
+
+    for url in ('ftp://example', 'https://example.com/' + 'a' * 300):
+        assert client.post('/partner/update', {'url': url}, format='json').json()['Status'] is False
+    assert not ImportJob.objects.exists()
+
+
+@pytest.mark.django_db
+def test_update_requires_shop_user(feed_url):
+    buyer = APIClient()
+    buyer.force_authenticate(User.objects.create(email='buyer@example.com', username='buyer', is_active=True))
+
+    assert APIClient().post('/partner/update', {'url': feed_url}, format='json').status_code == 403
+    assert buyer.post('/partner/update', {'url': feed_url}, format='json').status_code == 403
+    assert not ImportJob.objects.exists()
+    assert FeedHandler.requests == []
+
+
+@pytest.mark.django_db
+def test_feed_of_another_shop_is_rejected(partner, feed_url, celery_eager):
+    owner = User.objects.create(email='owner@example.com', username='owner', type='shop', is_active=True)
+    Shop.objects.create(name='Маркет', user=owner)
+    # у партнера уже есть свой магазин, прайс с другим магазином в него не загружается
+    other = User.objects.create(email='other@example.com', username='other', type='shop', is_active=True)
+    Shop.objects.create(name='Другой', user=other)
+
+    for user in (partner, other):
+        job = pull(feed_url, user)
+        assert job.state == 'failed'
+        assert 'Маркет' in job.errors[0]
+    assert not ProductInfo.objects.exists()
+    assert Shop.objects.get(name='Маркет').url is None
+
+
+def test_interrupted_download_leaves_no_file(feed_url, mocker, tmp_path, monkeypatch):
+    monkeypatch.setattr('tempfile.tempdir', str(tmp_path))
+
+    def broken_stream(*args, **kwargs):
+        yield b'shop: '
+        raise ConnectionError('обрыв')
+
+    mocker.patch('requests.models.Response.iter_content', broken_stream)
+
+    with pytest.raises(ConnectionError):
+        download_price_list(feed_url)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,41 @@
+import io
+
+import pytest
+import yaml
+
+from inetshop import feeds
+from inetshop.feeds import read_price_list, iter_price_list
+from tests.inetshop.conftest import FEED_PATH
+
+
+def test_stream_matches_full_loader():
+    with open(FEED_PATH) as fh:
+        data = yaml.load(fh, Loader=yaml.FullLoader)
+
+    with open(FEED_PATH, 'rb') as fh:
+        records = list(read_price_list(fh))
+
+    assert records == list(iter_price_list(data))
+    assert [key for key, _ in records].count('goods') == 4
+
+
+def test_stream_with_pure_python_loader(monkeypatch):
+    monkeypatch.setattr(feeds, 'FeedLoader', yaml.SafeLoader)
+
+    records = list(read_price_list(io.StringIO('shop: Маркет\ngoods:\n  - {id: 1, price: 10.5, name: "2"}\n')))
+
+    assert records == [('shop', 'Маркет'), ('goods', {'id': 1, 'price': 10.5, 'name': '2'})]
+
+
+def test_stream_is_lazy():
+    records = read_price_list(io.StringIO('shop: Маркет\ngoods:\n  - {id: 1}\n  - [broken\n'))
+
+    assert next(records) == ('shop', 'Маркет')
+    assert next(records) == ('goods', {'id': 1})
+    with pytest.raises(yaml.YAMLError):
+        next(records)
+
+
+def test_price_list_must_be_mapping():
+    with pytest.raises(yaml.YAMLError):
+        list(read_price_list(io.StringIO('- shop\n')))
@@ -0,0 +1,129 @@
+import pytest
+from django.db import IntegrityError
+
+from inetshop.feeds import iter_price_list
+from inetshop.importer import PriceListImporter
+from inetshop.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter
+
+
+def make_price_list(size):
+    return {
+        'shop': 'Большой магазин',
+        'categories': [{'id': 1, 'name': 'Смартфоны'}, {'id': 2, 'name': 'Аксессуары'}],
+        'goods': [{'id': number,
+                   'category': 1 + number % 2,
+                   'model': f'model/{number % 7}',
+                   'name': f'Товар {number}',
+                   'price': 100 + number,
+                   'price_rrc': 200 + number,
+                   'quantity': number % 5,
+                   'parameters': {'Цвет': 'черный', 'Вес (г)': number % 3}}
+                  for number in range(size)],
+    }
+
+
+@pytest.mark.django_db
+def test_import_price_list(price_list):
+    statistics = PriceListImporter().run(price_list)
+
+    shop = Shop.objects.get(name='Маркет')
+    assert statistics['rows'] == 4
+    assert statistics['rows_per_second'] > 0
+    assert Category.objects.filter(shops=shop).count() == 3
+    assert ProductInfo.objects.filter(shop=shop).count() == 4
+    assert ProductParameter.objects.count() == 16
+    assert Parameter.objects.count() == 4
+    info = ProductInfo.objects.get(external_id=4216293)
+    assert info.product.name == 'Смартфон Apple iPhone XS Max 512GB (золотистый)'
+    assert info.product_parameters.get(parameter__name='Диагональ (дюйм)').value == '6.5'
+
+
+@pytest.mark.django_db
+def test_reimport_reuses_products(price_list):
+    PriceListImporter().run(price_list)
+    PriceListImporter().run(price_list)
+
+    assert Product.objects.count() == 4
+    assert ProductInfo.objects.count() == 4
+    assert ProductParameter.objects.count() == 16
+
+
+@pytest.mark.django_db
+def test_import_query_count_does_not_grow_with_feed(django_assert_max_num_queries):
+    with django_assert_max_num_queries(45):
+        PriceListImporter(batch_size=1000).run(make_price_list(500))
+
+    assert ProductInfo.objects.count() == 500
+    assert ProductParameter.objects.count() == 1000
+
+
+@pytest.mark.django_db
+def test_unchanged_feed_is_not_rewritten(price_list, django_assert_max_num_queries):
+    PriceListImporter().run(price_list)
+    ids = set(ProductInfo.objects.values_list('id', flat=True))
+
+    with django_assert_max_num_queries(12):
+        statistics = PriceListImporter().run(price_list)
+
+    assert (statistics['inserted'], statistics['updated'], statistics['unchanged'], statistics['removed']) == \
+           (0, 0, 4, 0)
+    assert set(ProductInfo.objects.values_list('id', flat=True)) == ids
+
+
+@pytest.mark.django_db
+def test_sync_updates_changed_and_deactivates_missing_offers(price_list):
+    PriceListImporter().run(price_list)
+    removed = price_list['goods'].pop()
+    price_list['goods'][0]['price'] = 99000
+    price_list['goods'][1]['parameters']['Цвет'] = 'белый'
+    price_list['goods'].append({**removed, 'id': 1, 'parameters': {'Цвет': 'синий'}})
+
+    statistics = PriceListImporter().run(price_list)
+
+    assert (statistics['inserted'], statistics['updated'], statistics['unchanged'], statistics['removed']) == \
+           (1, 2, 1, 1)
+    assert ProductInfo.objects.get(external_id=price_list['goods'][0]['id']).price == 99000
+    assert ProductParameter.objects.get(product_info__external_id=price_list['goods'][1]['id'],
+                                        parameter__name='Цвет').value == 'белый'
+    assert not ProductInfo.objects.get(external_id=removed['id']).is_active
+
+    price_list['goods'].append(removed)
+    statistics = PriceListImporter().run(price_list)
+
+    assert statistics['updated'] == 1
+    assert ProductInfo.objects.get(external_id=removed['id']).is_active
+
+
+@pytest.mark.django_db
+def test_stream_import_in_batches():
+    statistics = PriceListImporter(batch_size=3).run_stream(iter_price_list(make_price_list(10)))
+
+    assert statistics['rows'] == statistics['inserted'] == 10
+    assert ProductInfo.objects.filter(is_active=True).count() == 10
+
+
+@pytest.mark.django_db
+def test_goods_before_shop_are_rejected():
+    with pytest.raises(ValueError):
+        PriceListImporter().run_stream([('goods', make_price_list(1)['goods'][0])])
+
+
+@pytest.mark.django_db
+def test_external_id_is_unique_per_shop():
+    PriceListImporter().run(make_price_list(2))
+    offer = ProductInfo.objects.order_by('id').first()
+
+    with pytest.raises(IntegrityError):
+        ProductInfo.objects.create(shop_id=offer.shop_id, external_id=offer.external_id,
+                                   product=Product.objects.exclude(id=offer.product_id).first(),
+                                   quantity=1, price=1, price_rrc=1)
+
+
+@pytest.mark.django_db
+def test_shop_is_created_once():
+    PriceListImporter().run(make_price_list(1))
+    PriceListImporter().run(make_price_list(2))
+
+    assert Shop.objects.filter(name='Большой магазин').count() == 1
+    with pytest.raises(IntegrityError):
+        Shop.objects.create(name='Большой магазин')
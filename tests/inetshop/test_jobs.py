@@ -0,0 +1,101 @@
+import pytest
+from rest_framework.test import APIClient
+
+from kombu.exceptions import OperationalError
+
+from inetshop.models import ImportJob, ProductInfo, User
+from tests.inetshop.conftest import FEED_PATH
+
+
+@pytest.fixture
+def partner():
+    return User.objects.create(email='shop@example.com', username='shop', type='shop', is_active=True)
+
+
+@pytest.fixture
+def client(partner):
+    client = APIClient()
+    client.force_authenticate(partner)
+    return client
+
+
+@pytest.mark.django_db
+def test_partner_update_runs_job(client, celery_eager, settings):
+    settings.PARTNER_PRICE_LIST = FEED_PATH
+
+    response = client.post('/partner/update')
+
+    job_id = response.json()['Job']
+    assert response.json()['Status'] is True
+    assert ProductInfo.objects.count() == 4
+
+    job = client.get(f'/partner/update/{job_id}').json()['Job']
+    assert job['state'] == 'done'
+    assert (job['processed'], job['total']) == (4, 4)
+    assert job['errors'] == []
+    assert job['duration'] >= 0
+    assert job['statistics']['inserted'] == 4
+
+
+@pytest.mark.django_db
+def test_failed_job_reports_errors(client, celery_eager, settings, tmp_path):
+    feed = tmp_path / 'broken.yaml'
+    feed.write_text('shop: Маркет\ngoods:\n  - {id: 1}\n', encoding='utf-8')
+    settings.PARTNER_PRICE_LIST = feed
+
+    job_id = client.post('/partner/update').json()['Job']
+
+    job = ImportJob.objects.get(id=job_id)
+    assert job.state == 'failed'
+    assert job.errors and job.errors[0].startswith('KeyError')
+    assert ProductInfo.objects.count() == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('item', ['{id: 1, category: 1, name: Товар, price: null, price_rrc: 1, quantity: 1, '
+                                  'parameters: {}}',
+                                  '{id: 1, category: 1, name: Товар, price: 1, price_rrc: 1, quantity: 1, '
+                                  'parameters: null}'])
+def test_malformed_item_fails_job(client, celery_eager, settings, tmp_path, item):
+    feed = tmp_path / 'broken.yaml'
+    feed.write_text(f'shop: Маркет\ncategories:\n  - {{id: 1, name: Смартфоны}}\ngoods:\n  - {item}\n',
+                    encoding='utf-8')
+    settings.PARTNER_PRICE_LIST = feed
+
+    job_id = client.post('/partner/update').json()['Job']
+
+    job = client.get(f'/partner/update/{job_id}').json()['Job']
+    assert job['state'] == 'failed'
+    assert job['errors']
+    assert job['duration'] >= 0
+
+
+@pytest.mark.django_db
+def test_unknown_job(client):
+    response = client.get('/partner/update/999')
+
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_job_is_visible_to_its_author_only(client, celery_eager, settings):
+    settings.PARTNER_PRICE_LIST = FEED_PATH
+    job_id = client.post('/partner/update').json()['Job']
+    other = APIClient()
+    other.force_authenticate(User.objects.create(email='other@example.com', username='other', type='shop',
+                                                 is_active=True))
+
+    assert other.get(f'/partner/update/{job_id}').status_code == 404
+    assert APIClient().get(f'/partner/update/{job_id}').status_code == 403
+
+
+@pytest.mark.django_db
+def test_broker_failure_fails_job(client, mocker):
+    mocker.patch('inetshop.views.import_price_list.delay', side_effect=OperationalError('connection refused'))
+
+    response = client.post('/partner/update')
+
+    assert response.status_code == 503
+    job = ImportJob.objects.get(id=response.json()['Job'])
+    assert job.state == 'failed'
+    assert job.errors == ['OperationalError: connection refused']
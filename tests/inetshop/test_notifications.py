@@ -0,0 +1,31 @@
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+
+from inetshop.tasks import send_notifications
+
+
+class CountingBackend(EmailBackend):
+    """
+    Почтовый бэкенд в памяти, который считает открытые соединения
+    """
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+
+@pytest.fixture
+def mailbox(settings, celery_eager):
+    settings.EMAIL_BACKEND = 'tests.inetshop.test_notifications.CountingBackend'
+    CountingBackend.opened = 0
+    return mail.outbox
+
+
+@pytest.mark.django_db
+def test_batch_uses_one_connection(mailbox):
+    send_notifications.delay([(f'Тема {number}', 'Текст', f'user{number}@example.com') for number in range(5)])
+
+    assert [message.to for message in mailbox] == [[f'user{number}@example.com'] for number in range(5)]
+    assert CountingBackend.opened == 1
@@ -0,0 +1,98 @@
+import pytest
+from rest_framework.test import APIClient
+
+from inetshop.importer import PriceListImporter
+from inetshop.models import Order, OrderItem, ProductInfo, User
+from inetshop.orders import place_order
+from tests.inetshop.test_importer import make_price_list
+
+
+@pytest.fixture
+def buyer():
+    PriceListImporter().run(make_price_list(5))
+    ProductInfo.objects.update(quantity=100)
+    user = User.objects.create(email='buyer@example.com', username='buyer', is_active=True)
+    info_ids = list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+    for number in range(25):
+        basket = Order.objects.create(user=user, state='basket')
+        OrderItem.objects.create(order=basket, product_info_id=info_ids[number % 5], quantity=1 + number % 3)
+        place_order(user.id, basket.id, None)
+    Order.objects.filter(user=user, id__in=Order.objects.filter(user=user).order_by('id')[:5].values('id')).update(
+        state='sent')
+    Order.objects.create(user=user, state='basket')
+    return user
+
+
+@pytest.fixture
+def client(buyer):
+    client = APIClient()
+    client.force_authenticate(buyer)
+    return client
+
+
+@pytest.mark.django_db
+def test_history_is_paginated(client, buyer):
+    first = client.get('/order').json()
+    second = client.get(first['next']).json()
+
+    ids = [order['id'] for order in first['results'] + second['results']]
+    assert len(first['results']) == 20
+    assert second['next'] is None
+    assert ids == list(Order.objects.filter(user=buyer).exclude(state='basket').order_by('-dt', '-id').values_list(
+        'id', flat=True))
+    assert first['results'][0]['ordered_items']
+
+
+@pytest.mark.django_db
+def test_history_only_shows_own_orders(buyer):
+    other = User.objects.create(id=buyer.id + 1000, email='other@example.com', username='other', is_active=True)
+    client = APIClient()
+    client.force_authenticate(other)
+
+    assert client.get('/order').json()['results'] == []
+
+
+@pytest.mark.django_db
+def test_history_state_filter(client):
+    response = client.get('/order', {'state': 'sent'}).json()
+
+    assert len(response['results']) == 5
+    assert {order['state'] for order in response['results']} == {'sent'}
+
+
+@pytest.mark.django_db
+def test_summary_skips_items(client, django_assert_max_num_queries):
+    with django_assert_max_num_queries(2):
+        response = client.get('/order', {'summary': 'true', 'page_size': 50}).json()
+
+    order = Order.objects.get(id=response['results'][0]['id'])
+    assert len(response['results']) == 25
+    assert set(response['results'][0]) == {'id', 'state', 'dt', 'total_sum', 'items_count'}
+    assert response['results'][0]['total_sum'] == order.total_sum
+
+
+@pytest.mark.django_db
+def test_invalid_summary_flag(client):
+    response = client.get('/order', {'summary': 'abc'})
+
+    assert response.status_code == 400
+    assert response.json()['Status'] is False
+
+
+@pytest.mark.django_db
+def test_order_detail(client, buyer):
+    order = Order.objects.filter(user=buyer, state='new').first()
+
+    response = client.get(f'/order/{order.id}').json()
+
+    assert response['id'] == order.id
+    assert [item['id'] for item in response['ordered_items']] == list(order.ordered_items.values_list('id', flat=True))
+
+
+@pytest.mark.django_db
+def test_order_detail_of_other_user(client, buyer):
+    other = User.objects.create(email='other@example.com', username='other', is_active=True)
+    order = Order.objects.create(user=other, state='new')
+
+    assert client.get(f'/order/{order.id}').status_code == 404
+    assert client.get(f'/order/{Order.objects.get(user=buyer, state="basket").id}').status_code == 404
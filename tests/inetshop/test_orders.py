@@ -0,0 +1,178 @@
+import threading
+import time
+
+import pytest
+from django.db import connection, connections
+from rest_framework.test import APIClient
+
+from inetshop.documents import rebuild_offer_documents
+from inetshop.importer import PriceListImporter
+from inetshop.models import CatalogOffer, Order, OrderItem, ProductInfo, User
+from inetshop.orders import OrderError, OutOfStock, cancel_order, place_order
+from tests.inetshop.test_importer import make_price_list
+
+CONTACT = {'city': 'Москва', 'street': 'Тверская', 'house': '1', 'phone': '+79990000000'}
+
+
+@pytest.fixture
+def offers():
+    PriceListImporter().run(make_price_list(5))
+    ProductInfo.objects.update(quantity=3)
+    return list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+
+
+def make_basket(email, lines):
+    user = User.objects.create(email=email, username=email, is_active=True)
+    basket = Order.objects.create(user=user, state='basket')
+    OrderItem.objects.bulk_create([OrderItem(order=basket, product_info_id=info_id, quantity=quantity)
+                                   for info_id, quantity in lines.items()])
+    return basket
+
+
+def stock(info_id):
+    return ProductInfo.objects.get(id=info_id).quantity
+
+
+@pytest.mark.django_db
+def test_order_reserves_stock(offers, django_capture_on_commit_callbacks):
+    basket = make_basket('buyer@example.com', {offers[0]: 2, offers[1]: 1})
+    client = APIClient()
+    client.force_authenticate(basket.user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post('/order', {'id': str(basket.id), **CONTACT}, format='json').json()
+
+    assert response['Status'] is True
+    assert (stock(offers[0]), stock(offers[1])) == (1, 2)
+    assert CatalogOffer.objects.get(product_info_id=offers[0]).document['quantity'] == 1
+    basket.refresh_from_db()
+    assert basket.state == 'new'
+
+
+@pytest.mark.django_db
+def test_order_is_not_oversold(offers):
+    first = make_basket('first@example.com', {offers[0]: 2})
+    second = make_basket('second@example.com', {offers[1]: 1, offers[0]: 2})
+    place_order(first.user_id, first.id, None)
+
+    with pytest.raises(OutOfStock) as error:
+        place_order(second.user_id, second.id, None)
+
+    assert error.value.product_info_id == offers[0]
+    # списание первой позиции второго заказа откатилось вместе с ним
+    assert (stock(offers[0]), stock(offers[1])) == (1, 3)
+    second.refresh_from_db()
+    assert second.state == 'basket'
+
+
+@pytest.mark.django_db
+def test_order_view_reports_out_of_stock(offers):
+    basket = make_basket('buyer@example.com', {offers[0]: 4})
+    client = APIClient()
+    client.force_authenticate(basket.user)
+
+    response = client.post('/order', {'id': str(basket.id), **CONTACT}, format='json').json()
+
+    assert response['Status'] is False
+    assert stock(offers[0]) == 3
+
+
+@pytest.mark.django_db
+def test_basket_is_placed_once(offers):
+    basket = make_basket('buyer@example.com', {offers[0]: 1})
+    place_order(basket.user_id, basket.id, None)
+
+    with pytest.raises(OrderError):
+        place_order(basket.user_id, basket.id, None)
+    assert stock(offers[0]) == 2
+
+
+@pytest.mark.django_db
+def test_cancel_returns_stock(offers):
+    basket = make_basket('buyer@example.com', {offers[0]: 2})
+    place_order(basket.user_id, basket.id, None)
+    client = APIClient()
+    client.force_authenticate(basket.user)
+
+    assert client.delete('/order', {'id': basket.id}, format='json').json()['Status'] is True
+    assert stock(offers[0]) == 3
+    # повторная отмена не возвращает товар второй раз
+    assert client.delete('/order', {'id': basket.id}, format='json').json()['Status'] is False
+    with pytest.raises(OrderError):
+        cancel_order(basket.user_id, basket.id)
+    assert stock(offers[0]) == 3
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_orders_never_oversell():
+    if connection.vendor == 'sqlite':
+        pytest.skip('SQLite не поддерживает одновременную запись из нескольких потоков')
+    PriceListImporter().run(make_price_list(3))
+    ProductInfo.objects.update(quantity=50)
+    offers = list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+    # встречный порядок позиций в корзинах проверяет отсутствие взаимоблокировок
+    baskets = [make_basket(f'buyer{number}@example.com',
+                           dict.fromkeys(offers if number % 2 else offers[::-1], 1)) for number in range(80)]
+    placed = []
+    failed = []
+
+    def worker(chunk):
+        try:
+            for basket in chunk:
+                try:
+                    place_order(basket.user_id, basket.id, None)
+                    placed.append(basket.id)
+                except OutOfStock:
+                    failed.append(basket.id)
+        finally:
+            connections.close_all()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(baskets[number::8],)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    assert len(placed) == 50
+    assert len(failed) == 30
+    assert set(ProductInfo.objects.values_list('quantity', flat=True)) == {0}
+    assert elapsed < 30
+
+
+@pytest.mark.django_db
+def test_checkout_snapshots_prices(offers, django_capture_on_commit_callbacks):
+    basket = make_basket('buyer@example.com', {offers[0]: 2, offers[1]: 1})
+    prices = dict(ProductInfo.objects.values_list('id', 'price'))
+    place_order(basket.user_id, basket.id, None)
+
+    # новая загрузка прайса не меняет уже оформленный заказ
+    ProductInfo.objects.update(price=1)
+    order = Order.objects.get(id=basket.id)
+
+    assert dict(order.ordered_items.values_list('product_info_id', 'price')) == {
+        offers[0]: prices[offers[0]], offers[1]: prices[offers[1]]}
+    assert (order.total_sum, order.items_count) == (2 * prices[offers[0]] + prices[offers[1]], 3)
+
+
+@pytest.mark.django_db
+def test_checkout_refreshes_catalog_etag(offers, django_capture_on_commit_callbacks):
+    # остатки в фикстуре изменены UPDATE, документы каталога пересобираем под них
+    rebuild_offer_documents(offers)
+    client = APIClient()
+    first = client.get('/product', {'in_stock': 'true', 'facets': 1, 'page_size': 100})
+    shops = client.get('/shops')
+    basket = make_basket('buyer@example.com', {offers[0]: 3})
+
+    with django_capture_on_commit_callbacks(execute=True):
+        place_order(basket.user_id, basket.id, None)
+
+    second = client.get('/product', {'in_stock': 'true', 'facets': 1, 'page_size': 100},
+                        HTTP_IF_NONE_MATCH=first['ETag'])
+    assert offers[0] in [document['id'] for document in first.json()['results']]
+    assert second.status_code == 200
+    assert offers[0] not in [document['id'] for document in second.json()['results']]
+    assert second.json()['facets']['Цвет'] == {'черный': len(offers) - 1}
+    # ответы без остатков заказ не делает устаревшими
+    assert client.get('/shops', HTTP_IF_NONE_MATCH=shops['ETag']).status_code == 304
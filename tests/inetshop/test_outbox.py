@@ -0,0 +1,236 @@
+from datetime import timedelta
+from smtplib import SMTPException
+
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from inetshop.importer import PriceListImporter
+from inetshop.models import ConfirmEmailToken, Order, OrderItem, OutboxMessage, ProductInfo, User
+from inetshop.orders import OutOfStock, place_order, transition_shop_orders
+from inetshop.outbox import OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_DELAY, _claim_batch, enqueue_order_status, \
+    relay_outbox, request_email_confirmation, requeue_dead
+from inetshop.tasks import relay_outbox as relay_outbox_task
+from tests.inetshop.test_importer import make_price_list
+
+
+class FlakyBackend(EmailBackend):
+    """
+    Почтовый бэкенд в памяти, который не принимает письма на адреса из failing
+    """
+    failing = set()
+
+    def send_messages(self, messages):
+        if any(set(message.to) & self.failing for message in messages):
+            raise SMTPException('Сервер недоступен')
+        return super().send_messages(messages)
+
+
+@pytest.fixture
+def mailbox(settings):
+    settings.EMAIL_BACKEND = 'tests.inetshop.test_outbox.FlakyBackend'
+    FlakyBackend.failing = set()
+    return mail.outbox
+
+
+@pytest.fixture
+def buyer():
+    PriceListImporter().run(make_price_list(2))
+    ProductInfo.objects.update(quantity=10)
+    return User.objects.create(email='buyer@example.com', username='buyer', is_active=True)
+
+
+def make_basket(user, quantity=1):
+    basket = Order.objects.create(user=user, state='basket')
+    OrderItem.objects.create(order=basket, product_info=ProductInfo.objects.order_by('id').first(), quantity=quantity)
+    return basket
+
+
+@pytest.mark.django_db
+def test_register_writes_outbox(mailbox, mocker):
+    mocker.patch('inetshop.views.validate_password')
+    response = APIClient().post('/user/register', {
+        'username': 'new', 'first_name': 'Иван', 'last_name': 'Иванов', 'email': 'new@example.com',
+        'password': 'Test1234', 'company': 'ООО', 'position': 'Менеджер', 'type': 'buyer'}).json()
+
+    assert response['Status'] is True
+    # запрос не отправляет писем, они уходят только через relay
+    assert mailbox == []
+    token = ConfirmEmailToken.objects.get(user__email='new@example.com')
+
+    assert relay_outbox() == {'sent': 1, 'retried': 0, 'dead': 0, 'emails': 1}
+    assert [message.to for message in mailbox] == [['new@example.com']]
+    assert token.key in mailbox[0].body
+    assert OutboxMessage.objects.get().state == 'sent'
+
+
+@pytest.mark.django_db
+def test_order_writes_outbox(mailbox, buyer):
+    basket = make_basket(buyer)
+    client = APIClient()
+    client.force_authenticate(buyer)
+
+    response = client.post('/order', {'id': str(basket.id), 'city': 'Москва', 'street': 'Ленина', 'house': '1',
+                                      'phone': '+70000000000'}).json()
+
+    assert response['Status'] is True
+    assert mailbox == []
+    assert OutboxMessage.objects.get().payload == {'user_id': buyer.id, 'order_id': basket.id, 'state': 'new'}
+
+    relay_outbox()
+    assert [message.to for message in mailbox] == [['buyer@example.com']]
+
+
+@pytest.mark.django_db
+def test_rolled_back_order_writes_nothing(buyer):
+    basket = make_basket(buyer, quantity=100)
+
+    with pytest.raises(OutOfStock):
+        place_order(buyer.id, basket.id, None)
+
+    assert not OutboxMessage.objects.exists()
+
+
+@pytest.mark.django_db
+def test_events_are_deduplicated(buyer):
+    basket = make_basket(buyer)
+    place_order(buyer.id, basket.id, None)
+    shop_id = ProductInfo.objects.order_by('id').first().shop_id
+
+    enqueue_order_status([(basket.id, buyer.id)], 'new')
+    transition_shop_orders(shop_id, [basket.id], 'confirmed')
+    transition_shop_orders(shop_id, [basket.id], 'confirmed')
+
+    assert list(OutboxMessage.objects.values_list('dedupe_key', flat=True)) == [
+        f'order:{basket.id}:new', f'order:{basket.id}:confirmed']
+
+
+@pytest.mark.django_db
+def test_failures_back_off_and_dead_letter(mailbox, buyer):
+    other = User.objects.create(email='other@example.com', username='other', is_active=True)
+    enqueue_order_status([(1, buyer.id), (2, other.id)], 'sent')
+    FlakyBackend.failing = {'other@example.com'}
+
+    assert relay_outbox() == {'sent': 1, 'retried': 1, 'dead': 0, 'emails': 1}
+    failed = OutboxMessage.objects.get(state='pending')
+    assert failed.attempts == 1
+    assert failed.available_at >= timezone.now() + timedelta(seconds=OUTBOX_RETRY_DELAY - 5)
+    # до истечения паузы письмо не отправляется повторно
+    assert relay_outbox() == {'sent': 0, 'retried': 0, 'dead': 0, 'emails': 0}
+
+    for attempt in range(2, OUTBOX_MAX_ATTEMPTS + 1):
+        OutboxMessage.objects.filter(id=failed.id).update(available_at=timezone.now())
+        relay_outbox()
+        failed.refresh_from_db()
+        assert failed.attempts == attempt
+    assert failed.state == 'dead'
+    assert [message.to for message in mailbox] == [['buyer@example.com']]
+
+    FlakyBackend.failing = set()
+    requeue_dead(OutboxMessage.objects.all())
+    assert relay_outbox() == {'sent': 1, 'retried': 0, 'dead': 0, 'emails': 1}
+
+
+@pytest.mark.django_db
+def test_relay_task_sends_batch(mailbox, buyer, celery_eager):
+    enqueue_order_status([(number, buyer.id) for number in range(1, 6)], 'assembled')
+    # у удаленного покупателя повторять отправку бессмысленно
+    enqueue_order_status([(10, buyer.id + 1000)], 'assembled')
+
+    assert relay_outbox_task.delay().get() == {'sent': 5, 'retried': 0, 'dead': 1, 'emails': 5}
+    assert len(mailbox) == 5
+    assert OutboxMessage.objects.get(state='dead').payload['order_id'] == 10
+
+
+@pytest.mark.django_db
+def test_critical_relay_skips_status_flood(mailbox, buyer):
+    enqueue_order_status([(number, buyer.id) for number in range(1, 11)], 'sent')
+    token = request_email_confirmation(buyer)
+
+    # подтверждение почты уходит первым, хотя в очереди перед ним смены статусов
+    assert relay_outbox(batch_size=1, kinds=['confirm_email'])['sent'] == 1
+    assert token.key in mailbox[0].body
+    assert relay_outbox(kinds=['confirm_email'])['sent'] == 0
+    assert relay_outbox(kinds=['order_status'])['sent'] == 10
+
+
+@pytest.fixture
+def digest(monkeypatch):
+    monkeypatch.setattr('inetshop.outbox.OUTBOX_DIGEST_WINDOW', 600)
+
+
+def close_window():
+    OutboxMessage.objects.filter(state='pending').update(available_at=timezone.now())
+
+
+@pytest.mark.django_db
+def test_digest_coalesces_status_changes(mailbox, buyer, digest):
+    enqueue_order_status([(number, buyer.id) for number in range(1, 4)], 'confirmed')
+    enqueue_order_status([(1, buyer.id), (2, buyer.id)], 'assembled')
+
+    # до конца окна ничего не отправляется
+    assert relay_outbox()['sent'] == 0
+    close_window()
+
+    assert relay_outbox() == {'sent': 5, 'retried': 0, 'dead': 0, 'emails': 1}
+    assert mailbox[0].body.splitlines() == ['Заказ №1: Собран', 'Заказ №2: Собран', 'Заказ №3: Подтвержден']
+
+
+@pytest.mark.django_db
+def test_digest_joins_events_of_open_window(mailbox, buyer, digest):
+    other = User.objects.create(email='other@example.com', username='other', is_active=True)
+    enqueue_order_status([(1, buyer.id), (2, other.id)], 'confirmed')
+    close_window()
+    # событие покупателя внутри еще открытого окна уходит вместе с первым
+    enqueue_order_status([(3, buyer.id)], 'confirmed')
+
+    assert relay_outbox() == {'sent': 3, 'retried': 0, 'dead': 0, 'emails': 2}
+    assert sorted(message.to[0] for message in mailbox) == ['buyer@example.com', 'other@example.com']
+
+
+@pytest.mark.django_db
+def test_leased_events_are_not_claimed_twice(mailbox, buyer, digest):
+    enqueue_order_status([(1, buyer.id), (2, buyer.id)], 'confirmed')
+    close_window()
+    # первый relay захватил пачку и еще отправляет ее
+    first = _claim_batch(100)
+    enqueue_order_status([(3, buyer.id)], 'confirmed')
+    close_window()
+
+    # второй relay берет только новое событие, без чужой пачки
+    assert [message.payload['order_id'] for message in first] == [1, 2]
+    assert [message.payload['order_id'] for message in _claim_batch(100)] == [3]
+    assert _claim_batch(100) == []
+
+    # после истечения захвата (relay упал) события снова уходят
+    OutboxMessage.objects.update(leased_until=timezone.now() - timedelta(seconds=1))
+    assert relay_outbox() == {'sent': 3, 'retried': 0, 'dead': 0, 'emails': 1}
+    assert not OutboxMessage.objects.filter(leased_until__isnull=False).exists()
+
+
+@pytest.mark.django_db
+def test_new_orders_skip_digest_window(mailbox, buyer, digest):
+    enqueue_order_status([(1, buyer.id)], 'new')
+
+    assert relay_outbox()['emails'] == 1
+    assert mailbox[0].body == 'Заказ сформирован'
+
+
+@pytest.mark.django_db
+def test_metrics(buyer, mailbox):
+    enqueue_order_status([(number, buyer.id) for number in range(1, 5)], 'sent')
+    relay_outbox(batch_size=3)
+    OutboxMessage.objects.filter(state='pending').update(created_at=timezone.now() - timedelta(minutes=2))
+    admin = User.objects.create(email='admin@example.com', username='admin', is_active=True, is_staff=True)
+    client = APIClient()
+    client.force_authenticate(admin)
+
+    metrics = client.get('/outbox/metrics').json()['Metrics']
+
+    assert (metrics['pending'], metrics['due'], metrics['dead']) == (1, 1, 0)
+    assert metrics['lag'] >= 120
+    assert metrics['throughput'] == 3 * 60 / 300
+    client.force_authenticate(buyer)
+    assert client.get('/outbox/metrics').status_code == 403
@@ -0,0 +1,52 @@
+import pytest
+from rest_framework.test import APIClient
+
+from inetshop.importer import PriceListImporter
+from inetshop.models import Category
+from inetshop.pagination import CatalogCursorPagination
+from tests.inetshop.test_importer import make_price_list
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.mark.django_db
+def test_categories_are_paginated_by_cursor(client):
+    Category.objects.bulk_create([Category(name=f'Категория {number}') for number in range(5)])
+
+    first = client.get('/categories', {'page_size': 2}).json()
+    second = client.get(first['next']).json()
+
+    assert [item['name'] for item in first['results']] == ['Категория 0', 'Категория 1']
+    assert [item['name'] for item in second['results']] == ['Категория 2', 'Категория 3']
+    assert first['previous'] is None
+
+
+@pytest.mark.django_db
+def test_page_size_is_capped(client):
+    Category.objects.bulk_create([Category(name=f'Категория {number}') for number in range(5)])
+    CatalogCursorPagination.max_page_size, max_page_size = 3, CatalogCursorPagination.max_page_size
+    try:
+        response = client.get('/categories', {'page_size': 1000}).json()
+    finally:
+        CatalogCursorPagination.max_page_size = max_page_size
+
+    assert len(response['results']) == 3
+
+
+@pytest.mark.django_db
+def test_deep_product_info_page_costs_the_same(client, django_assert_max_num_queries):
+    PriceListImporter().run(make_price_list(60))
+
+    url = '/product?page_size=10'
+    pages = 0
+    while url:
+        with django_assert_max_num_queries(3):
+            response = client.get(url).json()
+        url = response['next']
+        pages += 1
+
+    assert pages == 6
+    assert len(response['results']) == 10
@@ -0,0 +1,156 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from inetshop.importer import PriceListImporter
+from inetshop.models import Order, OrderItem, OutboxMessage, ProductInfo, Shop, User
+from inetshop.orders import OrderError, cancel_order, place_order, transition_shop_orders
+from tests.inetshop.test_importer import make_price_list
+
+
+@pytest.fixture
+def shops():
+    """
+    Два магазина по три предложения, заказы содержат позиции обоих
+    """
+    for name in ('Первый', 'Второй'):
+        price_list = make_price_list(3)
+        price_list['shop'] = name
+        PriceListImporter().run(price_list)
+    ProductInfo.objects.update(quantity=100)
+    partner = User.objects.create(email='shop@example.com', username='shop', type='shop', is_active=True)
+    Shop.objects.filter(name='Первый').update(user=partner)
+    return Shop.objects.get(name='Первый'), Shop.objects.get(name='Второй')
+
+
+@pytest.fixture
+def orders(shops):
+    buyer = User.objects.create(email='buyer@example.com', username='buyer', is_active=True)
+    first, second = shops
+    ids = []
+    for number in range(25):
+        basket = Order.objects.create(user=buyer, state='basket')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=basket, product_info=ProductInfo.objects.filter(shop=first)[number % 3], quantity=1),
+            OrderItem(order=basket, product_info=ProductInfo.objects.filter(shop=second)[number % 3], quantity=2)])
+        place_order(buyer.id, basket.id, None)
+        ids.append(basket.id)
+    # заказ только с товаром другого магазина в ленту первого не попадает
+    other = Order.objects.create(user=buyer, state='basket')
+    OrderItem.objects.create(order=other, product_info=ProductInfo.objects.filter(shop=second).first(), quantity=1)
+    place_order(buyer.id, other.id, None)
+    return ids
+
+
+@pytest.fixture
+def client(shops):
+    client = APIClient()
+    client.force_authenticate(shops[0].user)
+    return client
+
+
+@pytest.mark.django_db
+def test_feed_lists_shop_lines(client, shops, orders):
+    first = client.get('/partner/orders').json()
+    second = client.get(first['next']).json()
+
+    results = first['results'] + second['results']
+    assert len(first['results']) == 20
+    assert sorted(order['id'] for order in results) == sorted(orders)
+    for order in results:
+        assert [item['product_info']['shop'] for item in order['ordered_items']] == [shops[0].id]
+        assert order['total_sum'] == order['ordered_items'][0]['price']
+        assert order['state'] == 'new'
+
+
+@pytest.mark.django_db
+def test_feed_filters(client, orders):
+    Order.objects.filter(id__in=orders[:3]).update(dt=timezone.now() - timedelta(days=10))
+    OrderItem.objects.filter(order_id__in=orders[:3]).update(order_dt=timezone.now() - timedelta(days=10))
+    client.post('/partner/orders', {'ids': orders[:5], 'state': 'confirmed'}, format='json')
+
+    assert len(client.get('/partner/orders', {'state': 'confirmed'}).json()['results']) == 5
+    old = client.get('/partner/orders', {'date_to': (timezone.now() - timedelta(days=5)).date().isoformat()}).json()
+    assert sorted(order['id'] for order in old['results']) == sorted(orders[:3])
+    assert client.get('/partner/orders', {'date_from': 'вчера'}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_bulk_transition(client, shops, orders, django_assert_max_num_queries):
+    with django_assert_max_num_queries(7):
+        response = client.post('/partner/orders', {'ids': orders, 'state': 'confirmed'}, format='json').json()
+
+    assert response['Обновлено объектов Updated objects'] == 25
+    assert set(OrderItem.objects.filter(order_id__in=orders, shop=shops[0]).values_list(
+        'order_state', flat=True)) == {'confirmed'}
+
+    # из подтвержденного сразу в отправленный перевести нельзя
+    response = client.post('/partner/orders', {'ids': orders, 'state': 'sent'}, format='json').json()
+    assert response['Обновлено объектов Updated objects'] == 0
+
+
+@pytest.mark.django_db
+def test_transition_keeps_other_shops_lines(client, shops, orders):
+    client.post('/partner/orders', {'ids': orders, 'state': 'confirmed'}, format='json')
+
+    # позиции второго магазина не меняются, и заказ ждет его подтверждения
+    assert set(OrderItem.objects.filter(order_id__in=orders, shop=shops[1]).values_list(
+        'order_state', flat=True)) == {'new'}
+    assert set(Order.objects.filter(id__in=orders).values_list('state', flat=True)) == {'new'}
+    assert not OutboxMessage.objects.filter(dedupe_key__endswith=':confirmed').exists()
+
+    transition_shop_orders(shops[1].id, orders, 'confirmed')
+
+    assert set(Order.objects.filter(id__in=orders).values_list('state', flat=True)) == {'confirmed'}
+    assert OutboxMessage.objects.filter(dedupe_key__endswith=':confirmed').count() == 25
+
+
+@pytest.mark.django_db
+def test_order_follows_least_advanced_shop(shops, orders):
+    first, second = shops
+    for state in ('confirmed', 'assembled', 'sent'):
+        transition_shop_orders(first.id, orders, state)
+    assert set(Order.objects.filter(id__in=orders).values_list('state', flat=True)) == {'new'}
+
+    # второй магазин догоняет первого, и заказ проходит все статусы вместе с ним
+    for state in ('confirmed', 'assembled', 'sent'):
+        transition_shop_orders(second.id, orders, state)
+        assert set(Order.objects.filter(id__in=orders).values_list('state', flat=True)) == {state}
+        assert OutboxMessage.objects.filter(dedupe_key__endswith=f':{state}').count() == 25
+
+
+@pytest.mark.django_db
+def test_order_with_sent_lines_cannot_be_canceled(shops, orders):
+    for state in ('confirmed', 'assembled', 'sent'):
+        transition_shop_orders(shops[0].id, orders[:1], state)
+    order = Order.objects.get(id=orders[0])
+    stock = dict(ProductInfo.objects.values_list('id', 'quantity'))
+
+    with pytest.raises(OrderError):
+        cancel_order(order.user_id, order.id)
+
+    order.refresh_from_db()
+    assert order.state == 'new'
+    assert dict(ProductInfo.objects.values_list('id', 'quantity')) == stock
+
+
+@pytest.mark.django_db
+def test_transition_skips_foreign_orders(client, orders):
+    foreign = Order.objects.exclude(id__in=orders).get(state='new')
+
+    response = client.post('/partner/orders', {'ids': [foreign.id], 'state': 'confirmed'}, format='json').json()
+
+    assert response['Обновлено объектов Updated objects'] == 0
+    foreign.refresh_from_db()
+    assert foreign.state == 'new'
+
+
+@pytest.mark.django_db
+def test_feed_is_for_shops_only(orders):
+    client = APIClient()
+    client.force_authenticate(Order.objects.first().user)
+
+    assert client.get('/partner/orders').status_code == 403
+    assert client.post('/partner/orders', {'ids': orders, 'state': 'confirmed'}, format='json').status_code == 403
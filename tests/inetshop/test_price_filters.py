@@ -0,0 +1,107 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from inetshop.importer import PriceListImporter
+from inetshop.models import Shop
+from tests.inetshop.test_importer import make_price_list
+
+
+def offers(**params):
+    return APIClient().get('/product', params)
+
+
+def prices(**params):
+    return [document['price'] for document in offers(**params).json()['results']]
+
+
+@pytest.fixture
+def catalog():
+    PriceListImporter().run(make_price_list(30))
+    return Shop.objects.get()
+
+
+@pytest.mark.django_db
+def test_price_range(catalog):
+    assert prices(min_price=110, max_price=115) == [110, 111, 112, 113, 114, 115]
+    assert prices(min_price=127) == [127, 128, 129]
+
+
+@pytest.mark.django_db
+def test_in_stock(catalog):
+    documents = offers(in_stock='true', page_size=100).json()['results']
+
+    assert len(documents) == 24
+    assert all(document['quantity'] > 0 for document in documents)
+
+
+@pytest.mark.django_db
+def test_ordering(catalog):
+    assert prices(ordering='-price', page_size=3) == [129, 128, 127]
+    assert prices(ordering='price', max_price=102) == [100, 101, 102]
+    quantities = [document['quantity'] for document in offers(ordering='quantity', page_size=100).json()['results']]
+    assert quantities == sorted(quantities)
+
+
+@pytest.mark.django_db
+def test_ordering_is_paginated(catalog):
+    first = offers(ordering='-price', page_size=20).json()
+    second = APIClient().get(first['next']).json()
+
+    assert [document['price'] for document in first['results'] + second['results']] == list(range(129, 99, -1))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', [{'min_price': 'дорого'}, {'ordering': 'name'}, {'in_stock': 'может быть'}])
+def test_invalid_parameters(catalog, params):
+    response = offers(**params)
+
+    assert response.status_code == 400
+    assert response.json()['Status'] is False
+
+
+@pytest.mark.django_db
+def test_facets_follow_price_filters(catalog):
+    response = offers(facets=1, max_price=102, page_size=100).json()
+
+    assert len(response['results']) == 3
+    assert response['facets']['Цвет'] == {'черный': 3}
+    assert response['facets']['Вес (г)'] == {'0': 1, '1': 1, '2': 1}
+
+    in_stock = offers(facets=1, in_stock='true', param='Вес (г)=0', page_size=100).json()
+    assert in_stock['facets']['Цвет'] == {'черный': len(in_stock['results'])}
+
+
+def explain_view_query(params):
+    """
+    План того запроса к предложениям, который выполняет сам view с курсорной пагинацией
+    """
+    with CaptureQueriesContext(connection) as queries:
+        assert offers(**params).status_code == 200
+    sql = next(query['sql'] for query in queries if 'inetshop_catalogoffer' in query['sql'])
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # на маленькой таблице планировщик и так предпочел бы полный просмотр
+            cursor.execute('SET enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+        else:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params, index', [
+    ({'shop_id': 1, 'min_price': 110, 'ordering': 'price'}, 'catalog_offer_shop_price'),
+    ({'category_id': 1, 'max_price': 120, 'ordering': '-price'}, 'catalog_offer_category_price'),
+    ({'in_stock': 'true', 'min_price': 110, 'ordering': 'price'}, 'catalog_offer_in_stock_price'),
+])
+def test_price_queries_use_indexes(catalog, params, index):
+    if 'shop_id' in params:
+        params['shop_id'] = catalog.id
+
+    plan = explain_view_query(params)
+
+    assert index in plan
+    assert 'Seq Scan on inetshop_catalogoffer' not in plan
+    assert 'SCAN inetshop_catalogoffer' not in plan
@@ -0,0 +1,87 @@
+import pytest
+from rest_framework.test import APIClient
+
+from inetshop.importer import PriceListImporter
+from inetshop.models import CatalogOffer, ProductInfo
+from inetshop.search import search_offers
+
+
+def search(text, **params):
+    return APIClient().get('/product', {'q': text, **params}).json()
+
+
+def found_ids(text):
+    return [document['id'] for document in search(text)['results']]
+
+
+def external_ids(text):
+    ids = found_ids(text)
+    by_id = dict(ProductInfo.objects.filter(id__in=ids).values_list('id', 'external_id'))
+    return [by_id[info_id] for info_id in ids]
+
+
+@pytest.mark.django_db
+def test_search_by_name_model_and_parameters(price_list):
+    PriceListImporter().run(price_list)
+
+    assert sorted(external_ids('золотистый')) == [4216293]
+    assert sorted(external_ids('xs-max')) == [4216293]
+    assert sorted(external_ids('1792x828')) == [4216227, 4216314, 4672671]
+    assert sorted(external_ids('iphone синий')) == [4672671]
+
+
+@pytest.mark.django_db
+def test_search_matches_word_prefix(price_list):
+    PriceListImporter().run(price_list)
+
+    assert sorted(external_ids('красн')) == [4216314]
+    assert external_ids('ЗОЛОТ') == [4216293]
+
+
+@pytest.mark.django_db
+def test_search_is_ranked(price_list):
+    price_list['goods'][3]['name'] = 'Чехол для iPhone'
+    price_list['goods'][3]['parameters'] = {'Цвет': 'черный'}
+    PriceListImporter().run(price_list)
+
+    queryset = search_offers(CatalogOffer.objects.all(), 'черный')
+
+    ranks = [offer.rank for offer in queryset]
+    assert ranks == sorted(ranks, reverse=True)
+    # у XR 256GB слово встречается и в названии, и в цвете
+    assert queryset[0].product_info.external_id == 4216227
+
+
+@pytest.mark.django_db
+def test_search_index_follows_import(price_list):
+    PriceListImporter().run(price_list)
+    price_list['goods'][0]['name'] = 'Смартфон Apple iPhone XS Max 512GB (серебристый)'
+    price_list['goods'][0]['parameters']['Цвет'] = 'серебристый'
+    removed = price_list['goods'].pop()
+
+    PriceListImporter().run(price_list)
+
+    assert found_ids('золотистый') == []
+    assert external_ids('серебристый') == [4216293]
+    assert removed['id'] not in external_ids('iphone')
+
+
+@pytest.mark.django_db
+def test_search_is_paginated_and_filtered(price_list):
+    PriceListImporter().run(price_list)
+
+    first = search('iphone', page_size=3)
+    second = APIClient().get(first['next']).json()
+
+    assert first['count'] == 4
+    assert len(first['results']) == 3
+    assert len(second['results']) == 1
+    assert search('iphone', category_id=15)['results'] == []
+
+
+@pytest.mark.django_db
+def test_empty_search(price_list):
+    PriceListImporter().run(price_list)
+
+    assert found_ids('---') == []
+    assert found_ids('nokia') == []
@@ -4,7 +4,6 @@ from django.contrib.auth.password_validation import validate_password
 from prompt_toolkit.validation import ValidationError
 
 
-from inetshop.tasks import new_user_registered
 from inetshop.views import RegisterAccount
 from django.test import RequestFactory
 from inetshop.models import ConfirmEmailToken, User